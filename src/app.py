@@ -1,12 +1,13 @@
 import streamlit as st
-import base64
 import re, datetime, time
 import asyncio
+import itertools
 import streamlit as st
 import threading
 from concurrent.futures import Future
 from reservation.reservation_agent import ReservationAgent
 from llm import DocentBot
+from utils.thumbnails import thumbnail_url
 
 # Streamlit 페이지 설정
 st.set_page_config(page_title="도슨트 봇", page_icon="🎭", layout="centered")
@@ -94,7 +95,8 @@ how_to_use = """
 """
 
 
-def on_progress(func):
+def on_stream(stream):
+    """첫 토큰이 올 때까지만 스피너를 보이고, 이후에는 토큰이 도착하는 대로 렌더링한다."""
     overlay_placeholder = st.empty()
     overlay_placeholder.markdown(
         """
@@ -103,7 +105,10 @@ def on_progress(func):
         unsafe_allow_html=True,
     )
     with st.spinner("잠시만 기다려주세요."):
-        result = func()
+        first_chunk = next(stream, None)
+    result = ""
+    if first_chunk is not None:
+        result = st.write_stream(itertools.chain([first_chunk], stream))
 
     overlay_placeholder.empty()
     return result
@@ -202,8 +207,10 @@ def init_page():
             st.session_state.entered = True
             docent_bot = DocentBot()
             st.session_state.docent_bot = docent_bot
-            on_progress(lambda: docent_bot.move(is_next=True))
+            docent_bot.navigate(is_next=True)
             st.session_state.relic_card = docent_bot.relics.current_to_card()
+            # 해설은 다음 실행의 chat_area에서 스트리밍
+            st.session_state.pending_presentation = True
             st.rerun()
 
 
@@ -221,13 +228,12 @@ def main_page():
                 st.session_state.relic_card["title"],
             )
 
-            with open(img_path, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode()
-
+            # 원본을 base64로 싣지 않고 정적 경로의 WebP 썸네일을 쓴다. thumbnail_url은
+            # 원본의 수정 시각으로 경로를 정하므로 캐시하지 않는다
             st.markdown(
                 f'<div class="relic-card">'
                 f'<div class="relic-header">{header}</div>'
-                f'<img src="data:image/png;base64,{img_base64}" style="width:450px; height:540px; object-fit:contain;">'
+                f'<img src="{thumbnail_url(img_path)}" style="width:450px; height:540px; object-fit:contain;">'
                 f'<div class="relic-title">{title}</div>'
                 f"</div>",
                 unsafe_allow_html=True,
@@ -238,17 +244,19 @@ def main_page():
             with col_left:
                 if st.button("이전", use_container_width=True):
                     print("이전 버튼이 클릭되었습니다.")
-                    on_progress(lambda: docent_bot.move(is_next=False))
+                    docent_bot.navigate(is_next=False)
                     st.session_state.relic_card = docent_bot.relics.current_to_card(
                     )
+                    st.session_state.pending_presentation = True
                     st.rerun()
 
             with col_right:
                 if st.button("다음", use_container_width=True):
                     print("다음 버튼이 클릭되었습니다.")
-                    on_progress(lambda: docent_bot.move(is_next=True))
+                    docent_bot.navigate(is_next=True)
                     st.session_state.relic_card = docent_bot.relics.current_to_card(
                     )
+                    st.session_state.pending_presentation = True
                     st.rerun()
 
             st.markdown(
@@ -363,14 +371,16 @@ def main_page():
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
+        if st.session_state.pop("pending_presentation", False):
+            with st.chat_message("assistant"):
+                on_stream(docent_bot.present_stream())
+
         user_message = st.chat_input("메시지를 입력하세요.")
         if user_message:
             with st.chat_message("user"):
                 st.markdown(user_message)
-            docent_answer = on_progress(
-                lambda: docent_bot.answer(user_message))
             with st.chat_message("assistant"):
-                st.markdown(docent_answer)
+                on_stream(docent_bot.answer_stream(user_message))
 
     side_bar()
     chat_area()
@@ -0,0 +1,65 @@
+from typing import Callable, TypeVar
+import random
+import threading
+import time
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+
+class RateLimiter:
+    """스레드 간에 공유하는 초당 호출 수 제한기."""
+
+    def __init__(self, calls_per_second: float | None):
+        self.interval = 1 / calls_per_second if calls_per_second else 0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0) -> float:
+    """지수 백오프에 ±50% 지터를 더한 대기 시간."""
+    return base_delay * 2**attempt * (0.5 + random.random())
+
+
+def call_with_retries(
+    func: Callable[[], T],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    rate_limiter: RateLimiter | None = None,
+    retryable_errors: tuple[type[BaseException], ...] = RETRYABLE_ERRORS,
+) -> T:
+    """재시도 가능한 오류에 한해 지수 백오프(+지터)로 다시 호출한다."""
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            rate_limiter.wait()
+        try:
+            return func()
+        except retryable_errors as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            print(f"[retry {attempt + 1}/{max_retries}] {e} "
+                  f"({delay:.1f}초 후 재시도)")
+            time.sleep(delay)
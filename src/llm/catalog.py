@@ -0,0 +1,75 @@
+"""
+프로세스 전체가 공유하는 읽기 전용 전시물 카탈로그. 세션별 소개 여부는 Relics가 따로 가진다.
+"""
+
+import json
+import threading
+from types import MappingProxyType
+from .category_index import CategoryIndex
+from .catalog_store import (
+    CatalogStore,
+    LazyRelic,
+    compile_catalog,
+    default_catalog_path,
+    is_fresh,
+    relic_index_path,
+)
+
+
+class RelicCatalog:
+
+    _instance: "RelicCatalog | None" = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        with self._lock:
+            if getattr(self, "_initialized", False):
+                return
+            self._load()
+            self._initialized = True
+
+    def _load(self):
+        catalog_path = default_catalog_path
+        try:
+            if not is_fresh(catalog_path, relic_index_path):
+                # 원본이 바뀌었거나 아직 컴파일하지 않은 경우 한 번만 전체를 읽는다
+                with open(relic_index_path, "r", encoding="utf-8") as f:
+                    relic_index: dict = json.load(f)
+                compile_catalog(relic_index, catalog_path,
+                                source=relic_index_path)
+                print(f"[catalog] {catalog_path} 컴파일: {len(relic_index)}건")
+        except Exception as e:
+            import traceback
+
+            msg = f"Error loading relic_index.json: {traceback.format_exc()}"
+            print(msg)
+            raise e
+
+        self.store = CatalogStore(catalog_path)
+        database = {}
+        for position, (key, eager, lazy_fields) in enumerate(
+                self.store.iter_eager()):
+            database[key] = LazyRelic(self.store, position, eager,
+                                      lazy_fields)
+        self.database = MappingProxyType(database)
+        self.ids: tuple[str, ...] = tuple(database.keys())
+        self.positions = {relic_id: i for i, relic_id in enumerate(self.ids)}
+        # 시대/장르 검색용 색인을 카탈로그를 읽을 때 만들어 둔다
+        self.category_index = CategoryIndex(self.database)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def category_index_for(database: dict) -> CategoryIndex:
+    """카탈로그면 미리 만든 색인을, 다른 dict면 새 색인을 돌려준다."""
+    catalog = RelicCatalog()
+    if database is catalog.database:
+        return catalog.category_index
+    return CategoryIndex(database)
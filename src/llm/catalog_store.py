@@ -0,0 +1,199 @@
+"""
+relic_index.json을 SQLite 카탈로그로 컴파일한다. 원본이 바뀌면 RelicCatalog가 다시 컴파일한다.
+
+    cd src && python -m llm.catalog_store
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from contextlib import closing
+from pathlib import Path
+from types import MappingProxyType
+from typing import Iterator
+from utils import project_root
+from utils.storage import atomic_path
+
+CATALOG_VERSION = 2
+EAGER_FIELDS = ("title", "img_path", "category")
+database_dir = project_root / "data" / "database"
+relic_index_path = database_dir / "relic_index.json"
+default_catalog_path = Path(
+    os.getenv("CATALOG_PATH", str(database_dir / "catalog.sqlite")))
+
+
+def source_signature(path: str | Path) -> str:
+    stat = Path(path).stat()
+    return json.dumps([stat.st_mtime_ns, stat.st_size])
+
+
+def relic_img_path(relic_id: str, relic: dict) -> str:
+    return str(Path("data", "database", relic_id, Path(relic["img"]).name))
+
+
+def relic_title(relic_id: str, relic: dict) -> str:
+    return f"{relic['label']['명칭']} ({relic_id})"
+
+
+def compile_catalog(relic_index: dict,
+                    path: str | Path = default_catalog_path,
+                    source: str | Path | None = None):
+    """relic_index를 SQLite 카탈로그로 저장한다. 임시 파일에 쓴 뒤 교체한다."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(path) as tmp_path:
+        write_catalog(relic_index, tmp_path, source)
+
+
+def write_catalog(relic_index: dict, path: Path, source: str | Path | None):
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE relics (
+                position INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                img_path TEXT NOT NULL,
+                category TEXT NOT NULL
+            );
+            CREATE TABLE fields (
+                position INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (position, field)
+            ) WITHOUT ROWID;
+        """)
+        for position, (relic_id, relic) in enumerate(relic_index.items()):
+            conn.execute(
+                "INSERT INTO relics VALUES (?, ?, ?, ?, ?)",
+                (position, relic_id, relic_title(relic_id, relic),
+                 relic_img_path(relic_id, relic),
+                 json.dumps(relic.get("category", {}),
+                            ensure_ascii=False,
+                            sort_keys=True)))
+            conn.executemany(
+                "INSERT INTO fields VALUES (?, ?, ?)",
+                [(position, field, json.dumps(value, ensure_ascii=False))
+                 for field, value in relic.items()
+                 if field not in EAGER_FIELDS],
+            )
+        meta = {"version": str(CATALOG_VERSION)}
+        if source is not None:
+            meta["source"] = source_signature(source)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+    conn.close()
+
+
+def is_fresh(path: str | Path, source: str | Path) -> bool:
+    """카탈로그가 있고 지금의 원본으로 컴파일된 것인지."""
+    path, source = Path(path), Path(source)
+    if not path.exists():
+        return False
+    if not source.exists():
+        # 컴파일된 카탈로그만 배포된 경우
+        return True
+    try:
+        with closing(CatalogStore.connect(path)) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.Error:
+        return False
+    return (meta.get("version") == str(CATALOG_VERSION)
+            and meta.get("source") == source_signature(source))
+
+
+class CatalogStore:
+    """읽기 전용 연결을 스레드마다 하나씩 연다."""
+
+    def __init__(self, path: str | Path = default_catalog_path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def connect(path: str | Path) -> sqlite3.Connection:
+        return sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro",
+                               uri=True)
+
+    def iter_eager(self) -> Iterator[tuple[str, dict, tuple[str, ...]]]:
+        """(id, 바로 읽는 필드, 나중에 읽을 필드 이름들)을 카탈로그 순서대로."""
+        categories: dict[str, Mapping] = {}
+        rows = self.connection.execute("""
+            SELECT r.id, r.title, r.img_path, r.category, group_concat(f.field)
+            FROM relics r LEFT JOIN fields f ON f.position = r.position
+            GROUP BY r.position ORDER BY r.position
+        """)
+        for relic_id, title, img_path, category, fields in rows:
+            if category not in categories:
+                categories[category] = MappingProxyType(json.loads(category))
+            eager = {
+                "title": title,
+                "img_path": img_path,
+                "category": categories[category],
+            }
+            yield relic_id, eager, tuple(fields.split(",") if fields else ())
+
+    def field(self, position: int, field: str):
+        row = self.connection.execute(
+            "SELECT value FROM fields WHERE position = ? AND field = ?",
+            (position, field)).fetchone()
+        if row is None:
+            raise KeyError(field)
+        return json.loads(row[0])
+
+
+class LazyRelic(Mapping):
+    """title, img_path, category만 메모리에 두고 나머지는 접근할 때 읽는 읽기 전용 전시물."""
+
+    __slots__ = ("_store", "_position", "_eager", "_lazy_fields")
+
+    def __init__(self, store: CatalogStore, position: int, eager: dict,
+                 lazy_fields: tuple[str, ...]):
+        self._store = store
+        self._position = position
+        self._eager = eager
+        self._lazy_fields = lazy_fields
+
+    def __getitem__(self, field: str):
+        if field in self._eager:
+            return self._eager[field]
+        if field in self._lazy_fields:
+            return self._store.field(self._position, field)
+        raise KeyError(field)
+
+    def __iter__(self):
+        yield from self._eager
+        yield from self._lazy_fields
+
+    def __len__(self) -> int:
+        return len(self._eager) + len(self._lazy_fields)
+
+    def __contains__(self, field) -> bool:
+        return field in self._eager or field in self._lazy_fields
+
+    def __repr__(self) -> str:
+        return f"LazyRelic({self._eager['title']!r})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relic_index.json을 SQLite 카탈로그로 컴파일")
+    parser.add_argument("--source", type=Path, default=relic_index_path)
+    parser.add_argument("--output", type=Path, default=default_catalog_path)
+    args = parser.parse_args()
+    with open(args.source, "r", encoding="utf-8") as f:
+        relic_index = json.load(f)
+    compile_catalog(relic_index, args.output, source=args.source)
+    print(f"{args.output}: {len(relic_index)}건")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+category(nationality/period/genre) 값의 토큰별 역색인. "백제"는 "백제/신라"에도 맞는다.
+"""
+
+import re
+from collections import Counter
+
+FIELDS = ("nationality", "period", "genre")
+WILDCARDS = ("", "*", "전체", "모두", "all")
+TOKEN_SEPARATORS = re.compile(r"[/\s\-]+")
+PARENTHESIZED = re.compile(r"\(([^)]*)\)")
+# 카탈로그에 쓰인 값과 다르게 부르는 이름
+ALIASES = {
+    "통일신라": "신라",
+    "일제": "일제강점",
+    "일제강점기": "일제강점",
+    "원나라": "원",
+}
+
+
+def normalize_value(value: str | None) -> str:
+    return "".join((value or "").split()).lower()
+
+
+def canonical_token(token: str) -> str:
+    token = ALIASES.get(token, token)
+    # "조선시대" -> "조선" ("시대미상"은 그대로)
+    if token.endswith("시대") and len(token) > 2:
+        token = token[:-2]
+    return ALIASES.get(token, token)
+
+
+def value_tokens(value: str | None) -> frozenset[str]:
+    value = (value or "").lower()
+    tokens = TOKEN_SEPARATORS.split(PARENTHESIZED.sub(" ", value))
+    tokens += [normalize_value(group) for group in PARENTHESIZED.findall(value)]
+    return frozenset(canonical_token(token) for token in tokens if token)
+
+
+class CategoryIndex:
+
+    def __init__(self, database: dict):
+        self.ids = list(database.keys())
+        self.positions = {relic_id: i for i, relic_id in enumerate(self.ids)}
+        # field -> 정규화된 값 -> id 집합
+        self.postings: dict[str, dict[str, frozenset[str]]] = {}
+        # field -> 정규화된 값 -> 표시할 원래 값
+        self.labels: dict[str, dict[str, str]] = {}
+        # field -> 토큰 -> 그 토큰이 들어 있는 값들의 id 집합
+        self.token_postings: dict[str, dict[str, frozenset[str]]] = {}
+        for field in FIELDS:
+            postings: dict[str, set[str]] = {}
+            labels: dict[str, str] = {}
+            for relic_id, relic in database.items():
+                value = relic.get("category", {}).get(field)
+                if value is None:
+                    continue
+                key = normalize_value(value)
+                postings.setdefault(key, set()).add(relic_id)
+                labels.setdefault(key, value)
+            self.postings[field] = {
+                value: frozenset(ids)
+                for value, ids in postings.items()
+            }
+            self.labels[field] = labels
+            token_postings: dict[str, set[str]] = {}
+            for label in labels.values():
+                for token in value_tokens(label):
+                    token_postings.setdefault(token, set()).update(
+                        self.postings[field][normalize_value(label)])
+            self.token_postings[field] = {
+                token: frozenset(ids)
+                for token, ids in token_postings.items()
+            }
+
+    @staticmethod
+    def has_filter(condition: dict) -> bool:
+        """와일드카드가 아닌 조건이 하나라도 있는지."""
+        return any(
+            normalize_value(condition.get(field)) not in WILDCARDS
+            for field in FIELDS)
+
+    def matching_ids(self, field: str,
+                     value: str | None) -> frozenset[str] | None:
+        """조건에 맞는 id 집합. 와일드카드면 None."""
+        key = normalize_value(value)
+        if key in WILDCARDS:
+            return None
+        token_postings = self.token_postings[field]
+        if key in token_postings:
+            return token_postings[key]
+        # 모든 토큰을 가진 값만. 카탈로그에 없는 토큰("조선 후기"의 "후기")은 무시
+        tokens = [
+            token for token in value_tokens(value) if token in token_postings
+        ]
+        if not tokens:
+            return frozenset()
+        return frozenset.intersection(*(token_postings[token]
+                                        for token in tokens))
+
+    def search(self, condition: dict) -> list[str]:
+        """조건을 모두 만족하는 id를 카탈로그 순서대로 돌려준다."""
+        result: frozenset[str] | None = None
+        for field in FIELDS:
+            ids = self.matching_ids(field, condition.get(field))
+            if ids is None:
+                continue
+            result = ids if result is None else result & ids
+            if not result:
+                return []
+        if result is None:
+            return list(self.ids)
+        return sorted(result, key=self.positions.__getitem__)
+
+    def facets(self, ids: list[str]) -> dict[str, Counter]:
+        """검색 결과 안에서의 필드별 값 개수."""
+        ids = set(ids)
+        facets = {}
+        for field in FIELDS:
+            counts = Counter()
+            for key, posting in self.postings[field].items():
+                count = len(posting & ids)
+                if count:
+                    counts[self.labels[field][key]] = count
+            facets[field] = counts
+        return facets
@@ -0,0 +1,99 @@
+"""
+Anthropic / Upstage / Tavily 클라이언트를 프로세스 단위로 공유한다 (비동기는 이벤트 루프별).
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+from anthropic import (
+    Anthropic,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient as AnthropicAsyncHttpxClient,
+    DefaultHttpxClient as AnthropicHttpxClient,
+)
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient as OpenAIAsyncHttpxClient,
+    DefaultHttpxClient as OpenAIHttpxClient,
+    OpenAI,
+)
+from tavily import TavilyClient
+
+UPSTAGE_BASE_URL = "https://api.upstage.ai/v1"
+
+limits = httpx.Limits(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS",
+                                            "20")),
+    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+)
+timeout = httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "60")), connect=5.0)
+
+_lock = threading.Lock()
+_clients: dict[str, object] = {}
+# 이벤트 루프 -> {이름: 클라이언트}. 루프가 사라지면 함께 정리된다.
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _get_or_create(name: str, factory):
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def _get_or_create_async(name: str, factory):
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        if name not in loop_clients:
+            loop_clients[name] = factory()
+        return loop_clients[name]
+
+
+def get_anthropic() -> Anthropic:
+    return _get_or_create(
+        "anthropic",
+        lambda: Anthropic(http_client=AnthropicHttpxClient(limits=limits,
+                                                           timeout=timeout)),
+    )
+
+
+def get_async_anthropic() -> AsyncAnthropic:
+    """실행 중인 이벤트 루프 안에서만 호출할 것."""
+    return _get_or_create_async(
+        "anthropic",
+        lambda: AsyncAnthropic(http_client=AnthropicAsyncHttpxClient(
+            limits=limits, timeout=timeout)),
+    )
+
+
+def get_upstage() -> OpenAI:
+    return _get_or_create(
+        "upstage",
+        lambda: OpenAI(
+            api_key=os.getenv("UPSTAGE_API_KEY"),
+            base_url=UPSTAGE_BASE_URL,
+            http_client=OpenAIHttpxClient(limits=limits, timeout=timeout),
+        ),
+    )
+
+
+def get_async_upstage() -> AsyncOpenAI:
+    """실행 중인 이벤트 루프 안에서만 호출할 것."""
+    return _get_or_create_async(
+        "upstage",
+        lambda: AsyncOpenAI(
+            api_key=os.getenv("UPSTAGE_API_KEY"),
+            base_url=UPSTAGE_BASE_URL,
+            http_client=OpenAIAsyncHttpxClient(limits=limits,
+                                               timeout=timeout),
+        ),
+    )
+
+
+def get_tavily() -> TavilyClient:
+    return _get_or_create(
+        "tavily", lambda: TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
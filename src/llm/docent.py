@@ -1,6 +1,7 @@
-from anthropic import Anthropic
 import json
+import os
 from pathlib import Path
+from typing import Iterator
 from .prompt_templates import (
     guide_instruction,
     revisit_instruction,
@@ -9,41 +10,32 @@ from .prompt_templates import (
 from utils import get_base64_data
 from .llm import claude_3_7 as claude
 from .tools import use_tools
-
-client = Anthropic()
+from .catalog import RelicCatalog
+from .history import HistoryCompactor, estimate_tokens
+from .intent import TOOLS, intent_router
+from .narration_cache import (
+    NarrationCache,
+    narration_cache,
+    guide_prompt_hash,
+    default_artifact_path,
+)
 
 
 class Relics:
 
     def __init__(self, database=None):
+        # 카탈로그는 프로세스 전체가 공유하고, 세션마다 소개 여부만 따로 가진다
+        self.catalog = RelicCatalog()
         if database is None:
-            self._load_database()
+            self.database = self.catalog.database
+            self.ids = self.catalog.ids
+            self.presented = bytearray(len(self.catalog))
             self.original = self
         else:
             self.database = database
             self.original = None
         self.index = -1
 
-    def _load_database(self):
-        try:
-            file_path = Path("data") / "database" / "relic_index.json"
-            with open(file_path, "r", encoding="utf-8") as f:
-                self.database: dict = json.load(f)
-                for key, value in self.database.items():
-                    value["img_path"] = str(
-                        Path("data", "database", key, Path(value["img"]).name)
-                    )
-                    value["title"] = f"{value['label']['명칭']} ({key})"
-                    value["is_presented"] = False
-                    value["is_cached"] = False
-                self.ids = list(self.database.keys())
-        except Exception as e:
-            import traceback
-
-            msg = f"Error loading relic_index.json: {traceback.format_exc()}"
-            print(msg)
-            raise e
-
     @property
     def current_id(self):
         return self.ids[self.index]
@@ -73,8 +65,18 @@ class Relics:
         prefix = "검색된 작품" if isinstance(self, SearchedRelics) else ""
         return f"{prefix} {len(self.database)}점 중 {self.index + 1}번째 전시물입니다."
 
+    @property
+    def is_presented(self) -> bool:
+        return bool(self.original.presented[self.catalog.positions[
+            self.current_id]])
+
     def set_presented(self, is_presented: bool):
-        self.database[self.current_id]["is_presented"] = is_presented
+        self.original.presented[self.catalog.positions[
+            self.current_id]] = is_presented
+
+    def reset_presented(self, relic_ids):
+        for relic_id in relic_ids:
+            self.original.presented[self.catalog.positions[relic_id]] = False
 
     def current_to_card(self):
         return {
@@ -98,8 +100,6 @@ class SearchedRelics(Relics):
 
 class InstructionHandler:
 
-    first_present_index = 1
-
     def __init__(self):
         self.last_guide_id = ""
 
@@ -148,10 +148,6 @@ class InstructionHandler:
             }
         )
         self.last_guide_id = relics.current_id
-        if len(messages) == self.first_present_index + 1:
-            messages[self.first_present_index]["content"][1]["cache_control"] = {
-                "type": "ephemeral"
-            }
 
     def _remove_before_guide(self, messages: list):
         for idx in reversed(range(len(messages))):
@@ -199,20 +195,53 @@ class ExceptionHandler:
 
 class DocentBot:
 
-    def __init__(self):
+    def __init__(self,
+                 use_narration_cache: bool = True,
+                 history_token_budget: int | None = None):
+        self.use_narration_cache = use_narration_cache
         self.messages = []
         self.relics = Relics()
         self.instruction = InstructionHandler()
         self.instruction.add_guide_program(self.messages)
+        self.history = HistoryCompactor(
+            history_token_budget,
+            pinned=len(self.messages),
+        )
+
+    @property
+    def token_count(self) -> int:
+        """현재 대화 기록의 추정 입력 토큰 수."""
+        return estimate_tokens(self.messages)
+
+    def _is_standard_context(self) -> bool:
+        # 공용 캐시에는 관람 프로그램 + 안내 메시지만으로 만든 해설만 넣는다
+        # (앞선 질문이나 검색 결과가 섞인 해설은 다른 관람객에게 맞지 않음)
+        return len(self.messages) == self.history.pinned + 1
 
-    def _present_relic(self):
+    def _present_relic_stream(self) -> Iterator[str]:
         self.instruction.add_guide(self.relics, self.messages)
-        response_message = claude.create_response_text(messages=self.messages)
-        # response_message = "test...."
-        self.messages.append({"role": "assistant", "content": response_message})
+        cache_key = NarrationCache.key(
+            self.relics.current_id,
+            guide_prompt_hash(claude.model),
+        )
+        narration = (narration_cache.get(cache_key)
+                     if self.use_narration_cache else None)
+        if narration is not None:
+            yield narration
+        else:
+            self.history.compact(self.messages)
+            chunks = []
+            for text in claude.stream_response_text(messages=self.messages,
+                                                    call_site="narration"):
+                chunks.append(text)
+                yield text
+            narration = "".join(chunks)
+            if self.use_narration_cache and self._is_standard_context():
+                narration_cache.put(cache_key, narration)
+        self.messages.append({"role": "assistant", "content": narration})
         self.relics.set_presented(True)
 
-    def move(self, is_next: bool):
+    def navigate(self, is_next: bool):
         if is_next:
             try:
                 self.relics.next()
@@ -224,29 +253,49 @@ class DocentBot:
             except ValueError:
                 ExceptionHandler.underflow(self.messages, self.relics)
 
-        if not self.relics.current["is_presented"]:
-            self._present_relic()
+    def present_stream(self) -> Iterator[str]:
+        """현재 전시물을 아직 소개하지 않았다면 해설을 스트리밍한다."""
+        if not self.relics.is_presented:
+            yield from self._present_relic_stream()
+
+    def move(self, is_next: bool):
+        for _ in self.move_stream(is_next):
+            pass
+
+    def move_stream(self, is_next: bool) -> Iterator[str]:
+        self.navigate(is_next)
+        yield from self.present_stream()
 
     def answer(self, user_input: str) -> str:
+        return "".join(self.answer_stream(user_input))
+
+    def answer_stream(self, user_input: str) -> Iterator[str]:
         self.instruction.check_and_add(self.relics, self.messages)
         self.messages.append({"role": "user", "content": user_input})
-        searched_database, message_dict = use_tools(
-            self.get_conversation(),
-            self.relics.original_database,
-        )
+        searched_database, message_dict = None, None
+        # 현재 전시물에 대한 일반 질문은 도구 선택 호출 없이 바로 답한다
+        if intent_router.route(user_input) == TOOLS:
+            searched_database, message_dict = use_tools(
+                self.get_conversation(),
+                self.relics.original_database,
+            )
         if searched_database is not None:
             if len(searched_database) > 0:
                 self.relics = SearchedRelics(searched_database, self.relics.original)
+                # 검색된 전시물은 이미 본 것이라도 다시 소개한다
+                self.relics.reset_presented(searched_database)
             self.messages.append(message_dict)
-            response_message = message_dict["content"]
-        elif message_dict:
+            yield message_dict["content"]
+            return
+        if message_dict:
             self.messages.append(message_dict)
-            response_message = claude.create_response_text(messages=self.messages)
-            self.messages.append({"role": "assistant", "content": response_message})
-        else:
-            response_message = claude.create_response_text(messages=self.messages)
-            self.messages.append({"role": "assistant", "content": response_message})
-        return response_message
+        self.history.compact(self.messages)
+        chunks = []
+        for text in claude.stream_response_text(messages=self.messages,
+                                                call_site="answer"):
+            chunks.append(text)
+            yield text
+        self.messages.append({"role": "assistant", "content": "".join(chunks)})
 
     def get_conversation(self):
         conversation = []
@@ -260,3 +309,8 @@ class DocentBot:
                 continue
             conversation.append({"role": message["role"], "content": text_message})
         return conversation
+
+
+# llm.pregenerate로 미리 만든 해설이 있으면 시작 시 캐시에 채워 둔다
+narration_cache.load_artifact(
+    os.getenv("NARRATION_ARTIFACT", default_artifact_path), claude.model)
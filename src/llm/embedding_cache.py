@@ -0,0 +1,111 @@
+from io import BytesIO
+from pathlib import Path
+from typing import Callable
+import hashlib
+import threading
+import numpy as np
+from utils.storage import LRUCache, atomic_write_bytes
+
+
+class EmbeddingCache:
+    """질의 임베딩용 LRU 캐시.
+
+    메모리에는 최근 사용한 max_size개만 유지하고, cache_dir가 주어지면
+    디스크에도 .npy로 저장해 재시작 후에도 재사용한다.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        cache_dir: str | Path | None = None,
+    ):
+        self.max_size = max_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memory: LRUCache[str, np.ndarray] = LRUCache(max_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(text: str) -> str:
+        # 괄호나 한자를 지우면 "백자 (조선)"과 "백자 (고려)"가 같은 키가 되므로
+        # 공백과 대소문자만 정규화한다
+        return " ".join(text.split()).lower()
+
+    def get(self, text: str) -> np.ndarray | None:
+        key = self.key(text)
+        embedding = self._memory.get(key)
+        if embedding is not None:
+            with self._lock:
+                self.hits += 1
+            return embedding
+
+        embedding = self._load_from_disk(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory.put(key, embedding)
+        return embedding
+
+    def put(self, text: str, embedding: list[float] | np.ndarray):
+        key = self.key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._memory.put(key, embedding)
+        self._save_to_disk(key, embedding)
+
+    def get_or_create(
+        self,
+        text: str,
+        create: Callable[[str], list[float]],
+    ) -> np.ndarray:
+        embedding = self.get(text)
+        if embedding is None:
+            embedding = np.asarray(create(text), dtype=np.float32)
+            self.put(text, embedding)
+        return embedding
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": ((self.hits + self.disk_hits) /
+                              total if total else 0.0),
+            }
+
+    def clear(self):
+        self._memory.clear()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _disk_path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.npy"
+
+    def _load_from_disk(self, key: str) -> np.ndarray | None:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError) as e:
+            print(f"[embedding cache] 손상된 캐시 파일 무시: {path} ({e})")
+            return None
+
+    def _save_to_disk(self, key: str, embedding: np.ndarray):
+        if not self.cache_dir:
+            return
+        buffer = BytesIO()
+        np.save(buffer, embedding)
+        atomic_write_bytes(self._disk_path(key), buffer.getvalue())
@@ -0,0 +1,204 @@
+"""
+API 없이 pregenerate 등을 시험하는 로컬 Messages API 대역 서버.
+--fail로 준 문자열이 든 요청은 500으로 실패시킨다.
+
+    cd src && python -m llm.fake_messages --port 8765 --fail "반가사유상"
+    cd src && ANTHROPIC_BASE_URL=http://127.0.0.1:8765 python -m llm.pregenerate
+    cd src && python -m llm.fake_messages --check  # 실패 기록과 이어하기 확인
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from utils import project_root
+
+
+def last_user_text(body: dict) -> str:
+    for message in reversed(body.get("messages", [])):
+        if message["role"] != "user":
+            continue
+        content = message["content"]
+        if isinstance(content, str):
+            return content
+        return "".join(block.get("text", "") for block in content)
+    return ""
+
+
+class FakeMessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeMessagesServer"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        text = last_user_text(body)
+        with self.server.lock:
+            self.server.requests += 1
+            count = self.server.requests
+        if any(fail in text for fail in self.server.fail_texts):
+            self._send_json(500, {
+                "type": "error",
+                "error": {"type": "api_error", "message": "fake failure"},
+            })
+            return
+        reply = f"[{body['model']}] 해설 {count}"
+        if body.get("stream"):
+            self._send_stream(body["model"], reply)
+        else:
+            self._send_json(200, self._message(body["model"], reply))
+
+    @staticmethod
+    def _message(model: str, text: str) -> dict:
+        return {
+            "id": "msg_fake",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1, "output_tokens": 1},
+        }
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, text: str):
+        message = self._message(model, "")
+        message["content"] = []
+        message["stop_reason"] = None
+        events = [
+            ("message_start", {"type": "message_start", "message": message}),
+            ("content_block_start", {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            }),
+            ("content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": text},
+            }),
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": 1},
+            }),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        for event, data in events:
+            self.wfile.write(
+                f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                .encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeMessagesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, fail_texts: list[str] | None = None):
+        super().__init__(("127.0.0.1", port), FakeMessagesHandler)
+        self.fail_texts = list(fail_texts or [])
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def run_pregenerate(server: FakeMessagesServer, output: Path,
+                    relic_ids: list[str], n_variants: int) -> int:
+    env = dict(os.environ,
+               ANTHROPIC_BASE_URL=server.base_url,
+               ANTHROPIC_API_KEY=os.getenv("ANTHROPIC_API_KEY", "fake"),
+               LLM_MAX_RETRIES="0")
+    result = subprocess.run(
+        [sys.executable, "-m", "llm.pregenerate",
+         "--output", str(output),
+         "--variants", str(n_variants),
+         "--relic-ids", *relic_ids],
+        cwd=project_root / "src",
+        env=env,
+    )
+    return result.returncode
+
+
+def check(n_relics: int = 3, n_variants: int = 2) -> bool:
+    """한 건을 실패시킨 뒤 다시 실행해, 실패 기록과 실패한 건만 이어서 생성하는지 확인한다."""
+    with open(project_root / "data" / "database" / "relic_index.json",
+              "r", encoding="utf-8") as f:
+        relic_index = json.load(f)
+    relic_ids = list(relic_index)[:n_relics]
+    failed_id = relic_ids[-1]
+    server = FakeMessagesServer(
+        fail_texts=[relic_index[failed_id]["label"]["명칭"]])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "narrations.json"
+
+        returncode = run_pregenerate(server, output, relic_ids, n_variants)
+        with open(output, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+        first_ok = (returncode == 1
+                    and list(artifact["failures"]) == [failed_id]
+                    and sorted(artifact["narrations"]) == sorted(relic_ids[:-1]))
+        print(f"1회차(실패 기록): {'통과' if first_ok else '실패'} "
+              f"exit={returncode} failures={list(artifact['failures'])}")
+        ok &= first_ok
+
+        server.fail_texts.clear()
+        before = server.requests
+        returncode = run_pregenerate(server, output, relic_ids, n_variants)
+        with open(output, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+        resumed = server.requests - before
+        second_ok = (returncode == 0
+                     and not artifact["failures"]
+                     and resumed == n_variants
+                     and all(len(artifact["narrations"][relic_id]) == n_variants
+                             for relic_id in relic_ids))
+        print(f"2회차(이어하기): {'통과' if second_ok else '실패'} "
+              f"exit={returncode} 요청 {resumed}건")
+        ok &= second_ok
+    server.shutdown()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 Messages API 대역 서버")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail", nargs="*", default=[],
+                        help="이 문자열이 든 요청은 500으로 실패시킨다")
+    parser.add_argument("--check", action="store_true",
+                        help="pregenerate 실패 기록/이어하기 확인 후 종료")
+    args = parser.parse_args()
+    if args.check:
+        raise SystemExit(0 if check() else 1)
+    server = FakeMessagesServer(args.port, args.fail)
+    print(f"{server.base_url}/v1/messages 대기 중")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
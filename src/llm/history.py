@@ -0,0 +1,127 @@
+"""
+DocentBot 대화 기록을 토큰 예산 안으로 유지한다. 빼낸 턴은 <history_summary>로 요약해 남긴다.
+"""
+
+import os
+from utils.image_cache import image_payload_cache
+from .prompt_cache import is_guide_message
+
+# 이미지는 image_payload_cache가 토큰 예산 안으로 줄여 보내므로 그 예산으로 계산한다
+IMAGE_TOKENS = image_payload_cache.token_budget
+# 한국어 위주 텍스트의 보수적 추정치
+CHARS_PER_TOKEN = 2
+SUMMARY_TAG = "<history_summary>"
+SUMMARY_LINE_LENGTH = 80
+MAX_SUMMARY_LINES = 40
+
+
+def estimate_tokens(messages: list) -> int:
+    total = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            total += len(content) // CHARS_PER_TOKEN + 1
+            continue
+        for block in content:
+            if block.get("type") == "image":
+                total += IMAGE_TOKENS
+            else:
+                text = str(
+                    block.get("text") or block.get("content")
+                    or block.get("input") or "")
+                total += len(text) // CHARS_PER_TOKEN + 1
+    return total
+
+
+def is_user_input(message: dict) -> bool:
+    content = message["content"]
+    return (message["role"] == "user" and isinstance(content, str)
+            and not content.strip().startswith("<system_command>"))
+
+
+def has_block(message: dict, block_type: str) -> bool:
+    content = message["content"]
+    return isinstance(content, list) and any(
+        block.get("type") == block_type for block in content)
+
+
+class HistoryCompactor:
+
+    def __init__(
+        self,
+        token_budget: int | None = None,
+        low_watermark: float = 0.7,
+        pinned: int = 1,
+    ):
+        self.token_budget = token_budget or int(
+            os.getenv("DOCENT_HISTORY_TOKEN_BUDGET", "20000"))
+        self.low_watermark = low_watermark
+        self.pinned = pinned  # 맨 앞에서 항상 남길 메시지 수
+
+    def compact(self, messages: list) -> bool:
+        """messages를 제자리에서 줄인다. 줄였으면 True."""
+        if estimate_tokens(messages) <= self.token_budget:
+            return False
+
+        protected = set(range(min(self.pinned, len(messages))))
+        for idx in reversed(range(len(messages))):
+            if is_guide_message(messages[idx]):
+                protected.add(idx)
+                break
+        last_input = next((idx for idx in reversed(range(len(messages)))
+                           if is_user_input(messages[idx])),
+                          len(messages) - 1)
+        protected.update(range(last_input, len(messages)))
+
+        droppable = [
+            idx for idx in range(len(messages)) if idx not in protected
+        ]
+        summary_lines = []
+        target = self.token_budget * self.low_watermark
+        remaining = estimate_tokens(messages)
+        dropped = set()
+        position = 0
+        while position < len(droppable) and remaining > target:
+            idx = droppable[position]
+            position += 1
+            dropped.add(idx)
+            remaining -= estimate_tokens([messages[idx]])
+            summary_lines.extend(self._summarize(messages[idx]))
+            # tool_use를 빼면 짝이 되는 tool_result도 함께 뺀다
+            while (has_block(messages[idx], "tool_use")
+                   and position < len(droppable)
+                   and droppable[position] == idx + 1):
+                idx = droppable[position]
+                position += 1
+                dropped.add(idx)
+                remaining -= estimate_tokens([messages[idx]])
+        if not dropped:
+            return False
+
+        summary_lines = summary_lines[-MAX_SUMMARY_LINES:]
+        kept = [m for idx, m in enumerate(messages) if idx not in dropped]
+        if summary_lines:
+            summary = {
+                "role": "user",
+                "content": (f"<system_command>\n{SUMMARY_TAG}\n" +
+                            "\n".join(summary_lines) +
+                            "\n</history_summary>\n</system_command>"),
+            }
+            kept.insert(min(self.pinned, len(kept)), summary)
+        messages[:] = kept
+        return True
+
+    @staticmethod
+    def _summarize(message: dict) -> list[str]:
+        content = message["content"]
+        if not isinstance(content, str):
+            return []
+        text = content.strip()
+        if text.startswith("<system_command>"):
+            # 이전 요약은 줄 단위로 이어 붙인다
+            if SUMMARY_TAG not in text:
+                return []
+            body = text.split(SUMMARY_TAG, 1)[1].split("</history_summary>")[0]
+            return [line for line in body.splitlines() if line.strip()]
+        speaker = "관람객" if message["role"] == "user" else "도슨트"
+        return [f"{speaker}: {' '.join(text.split())[:SUMMARY_LINE_LENGTH]}"]
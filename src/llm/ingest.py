@@ -0,0 +1,138 @@
+"""
+relic_data.json들로 relic_index.json, 카탈로그, 벡터 저장소, 이미지 캐시를 만든다.
+
+    cd src && python -m llm.ingest --workers 4 --calls-per-second 2
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+from utils.image_cache import image_payload_cache, relic_image_paths
+from utils.storage import atomic_write_text
+from utils.thumbnails import precompute_thumbnails
+from .vector_search import Collecton, clean_text
+from .catalog_store import compile_catalog, database_dir, relic_index_path
+
+# 이미지 설명, 추천, 감상, 분류는 relic_data.json에 없고 별도로 생성된 값이므로 유지
+DERIVED_FIELDS = ("image_description", "recommendation", "impression",
+                  "category")
+# relic_data.json은 url 형식과 label 띄어쓰기(예: "본관 1958")가 앱이 쓰는
+# relic_index.json과 다르므로, 이미 있는 전시물은 기존 값을 유지
+CURATED_FIELDS = ("url", "img", "label")
+
+
+def iter_relic_data(
+        directory: Path = database_dir) -> Iterator[tuple[str, dict]]:
+    """relic_data.json을 하나씩 읽어 (relic_id, relic_data)로 돌려준다."""
+    entries = sorted(
+        (entry for entry in os.scandir(directory)
+         if entry.is_dir() and entry.name.isdigit()),
+        key=lambda entry: int(entry.name),
+    )
+    for entry in entries:
+        file_path = Path(entry.path) / "relic_data.json"
+        if not file_path.exists():
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield entry.name, json.load(f)
+
+
+def title_doc(label: dict) -> str:
+    name = clean_text(label["명칭"]).strip()
+    other_name = clean_text(label.get("다른명칭", "")).strip()
+    return f"{name}, {other_name}"
+
+
+def content_doc(relic: dict) -> str:
+    return clean_text(relic.get("content", "")).strip() or title_doc(
+        relic["label"])
+
+
+def description_doc(relic: dict) -> str | None:
+    if not relic.get("image_description"):
+        return None
+    return clean_text(relic["image_description"])
+
+
+def build_relic_index(previous_index: dict) -> dict:
+    relic_index = {}
+    for relic_id, relic_data in iter_relic_data():
+        relic = {k: v for k, v in relic_data.items() if k != "thumbs"}
+        previous = previous_index.get(relic_id, {})
+        for field in DERIVED_FIELDS + CURATED_FIELDS:
+            if field in previous:
+                relic[field] = previous[field]
+        relic_index[relic_id] = relic
+    return relic_index
+
+
+def ingest(
+    max_workers: int = 4,
+    calls_per_second: float | None = None,
+    chunk_size: int = 100,
+    max_retries: int = 3,
+):
+    previous_index = {}
+    if relic_index_path.exists():
+        with open(relic_index_path, "r", encoding="utf-8") as f:
+            previous_index = json.load(f)
+
+    relic_index = build_relic_index(previous_index)
+    atomic_write_text(relic_index_path,
+                      json.dumps(relic_index, ensure_ascii=False, indent=2))
+    print(f"relic_index.json: {len(relic_index)}건")
+    compile_catalog(relic_index, source=relic_index_path)
+
+    collections = {
+        name: Collecton(name)
+        for name in ("title", "description", "content")
+    }
+    for collection in collections.values():
+        collection.clear()
+
+    missing_descriptions = []
+    for relic_id, relic in relic_index.items():
+        collections["title"].add_doc(relic_id, title_doc(relic["label"]))
+        collections["content"].add_doc(relic_id, content_doc(relic))
+        description = description_doc(relic)
+        if description is None:
+            missing_descriptions.append(relic_id)
+        else:
+            collections["description"].add_doc(relic_id, description)
+    if missing_descriptions:
+        print(f"image_description이 없어 description 컬렉션에서 제외: "
+              f"{missing_descriptions}")
+
+    for collection in collections.values():
+        collection.build(
+            chunk_size=chunk_size,
+            max_workers=max_workers,
+            calls_per_second=calls_per_second,
+            max_retries=max_retries,
+        )
+
+    # 안내 메시지에 들어갈 이미지 payload와 사이드바 썸네일도 미리 만들어 둔다
+    image_paths = relic_image_paths()
+    image_payload_cache.precompute(image_paths, max_workers=max_workers)
+    precompute_thumbnails(image_paths, max_workers=max_workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="유물 카탈로그와 벡터 저장소 생성")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--calls-per-second", type=float, default=None)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--max-retries", type=int, default=3)
+    args = parser.parse_args()
+    ingest(
+        max_workers=args.workers,
+        calls_per_second=args.calls_per_second,
+        chunk_size=args.chunk_size,
+        max_retries=args.max_retries,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+현재 전시물에 대한 질문은 도구 선택 호출 없이 바로 답하고, 나머지만 use_tools로 보낸다.
+"""
+
+import os
+import re
+import threading
+import numpy as np
+from openai import APIError
+from .vector_search import get_embeddings, get_query_embedding, normalize
+
+ANSWER = "answer"
+TOOLS = "tools"
+
+SEARCH_KEYWORDS = re.compile(
+    r"찾아|검색|보여\s*줘|보고\s*싶|추천|다른\s*(작품|전시물|유물)|말고|비슷한"
+    r"|(작품|전시물|유물|것|거)\s*(도|은|는|이|가)?\s*(있|없)(어|나요|을까|습니까)")
+# "이 그림 속 인물은 누구야?"처럼 현재 전시물을 가리키면 쓰지 않는다
+FACT_KEYWORDS = re.compile(r"역사|당시|왕|누구|사건|전쟁|배경")
+DEICTIC_KEYWORDS = re.compile(
+    r"(?<![가-힣])이\s*(작품|전시물|유물|그림|회화|초상화|글씨|서예|조각|불상|석탑|탑"
+    r"|도자기|청자|백자|분청사기|토기|항아리|왕관|금관|비석|거울|장신구)"
+    r"|이것|이거|여기|지금\s*보")
+CATEGORY_KEYWORDS = re.compile(
+    r"구석기|신석기|청동기|철기|삼국|고구려|백제|신라|가야|발해|낙랑|고려|조선|대한제국|일제"
+    r"|중국|일본|그리스|백자|청자|분청|토기|도자기|불상|금관|회화|서예|공예|장신구|복식|건축")
+# 메시지 전체가 인사/감사/맞장구일 때만 (fullmatch)
+SMALL_TALK = re.compile(r"(고마워요?|고맙습니다|감사(합니다|해요)?|좋아요?|좋네요?|알겠어요?"
+                        r"|알겠습니다|네|응|오+|와+|멋져요?|멋지네요?|대단하네요?)"
+                        r"[\s!.~ㅎㅋ]*")
+
+ANSWER_PROTOTYPES = [
+    "이 작품에 대해 더 자세히 설명해줘",
+    "이건 무엇으로 만들었어?",
+    "크기는 얼마나 돼?",
+    "어떤 기법으로 만든 거야?",
+    "무늬가 무엇을 의미해?",
+    "이 부분은 왜 이렇게 생겼어?",
+    "언제 만들어진 거야?",
+    "왜 국보로 지정됐어?",
+    "색깔이 특이하네",
+    "재미있는 이야기 더 해줘",
+    "박물관 해설 프로그램은 어떻게 신청해?",
+]
+TOOL_PROTOTYPES = [
+    "조선시대 백자 찾아줘",
+    "신라시대 불상 보고 싶어",
+    "금관 보여줘",
+    "고려청자 있어?",
+    "반가사유상 검색해줘",
+    "다른 그림도 추천해줘",
+    "세종대왕은 어떤 업적을 남겼어?",
+    "임진왜란은 언제 일어났어?",
+    "통일신라의 역사를 알려줘",
+]
+
+
+class IntentRouter:
+
+    def __init__(
+        self,
+        use_embeddings: bool = True,
+        min_similarity: float = 0.5,
+        margin: float = 0.05,
+    ):
+        self.use_embeddings = use_embeddings
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.counts = {ANSWER: 0, TOOLS: 0}
+        self._prototypes: tuple[np.ndarray, np.ndarray] | None = None
+        self._lock = threading.Lock()
+
+    def route(self, message: str) -> str:
+        intent = self.classify(message)
+        with self._lock:
+            self.counts[intent] += 1
+        return intent
+
+    def classify(self, message: str) -> str:
+        text = message.strip()
+        is_deictic = DEICTIC_KEYWORDS.search(text) is not None
+        if SEARCH_KEYWORDS.search(text) or (FACT_KEYWORDS.search(text)
+                                            and not is_deictic):
+            return TOOLS
+        if CATEGORY_KEYWORDS.search(DEICTIC_KEYWORDS.sub(" ", text)):
+            return TOOLS
+        if is_deictic or SMALL_TALK.fullmatch(text):
+            return ANSWER
+        if not self.use_embeddings:
+            return TOOLS
+        try:
+            answer_score, tool_score = self._prototype_scores(text)
+        except APIError as e:
+            # 400/401 등 재시도할 수 없는 오류도 답변을 막지 않도록 도구 선택으로 넘긴다
+            print(f"[intent] 임베딩 실패로 도구 선택 호출 사용: {e}")
+            return TOOLS
+        if (answer_score >= self.min_similarity
+                and answer_score - tool_score >= self.margin):
+            return ANSWER
+        return TOOLS
+
+    def _prototype_scores(self, text: str) -> tuple[float, float]:
+        answer_matrix, tool_matrix = self._load_prototypes()
+        query_vector = normalize(
+            np.asarray(get_query_embedding(text), dtype=np.float32))
+        return (float((answer_matrix @ query_vector).max()),
+                float((tool_matrix @ query_vector).max()))
+
+    def _load_prototypes(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._prototypes is not None:
+            return self._prototypes
+        # 네트워크 호출은 잠금 밖에서 한다. 처음에 동시에 들어오면 여러 번 계산될 수
+        # 있지만 결과는 같으므로 먼저 끝난 것을 쓴다
+        # 한 번의 배치 호출로 두 묶음을 함께 임베딩한다
+        embeddings = normalize(
+            np.asarray(get_embeddings(ANSWER_PROTOTYPES + TOOL_PROTOTYPES),
+                       dtype=np.float32))
+        prototypes = (embeddings[:len(ANSWER_PROTOTYPES)],
+                      embeddings[len(ANSWER_PROTOTYPES):])
+        with self._lock:
+            if self._prototypes is None:
+                self._prototypes = prototypes
+            return self._prototypes
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "fast_path_ratio":
+                self.counts[ANSWER] / total if total else 0.0,
+            }
+
+
+intent_router = IntentRouter(use_embeddings=os.getenv(
+    "INTENT_EMBEDDINGS", "on").lower() not in ("off", "0", "false"))
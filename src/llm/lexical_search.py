@@ -0,0 +1,120 @@
+from collections import Counter, defaultdict
+import re
+import threading
+import numpy as np
+from .vector_search import (
+    HANJA_RE,
+    Collecton,
+    Similarity,
+    select_top_k,
+    title_collection,
+    content_collection,
+    description_collection,
+)
+
+WORD_RE = re.compile(r"[0-9A-Za-z가-힣]+")
+# 이보다 짧은 질의("탑", "불상")는 명칭 일치로 보지 않는다
+EXACT_MATCH_MIN_LENGTH = 4
+
+
+def tokenize(text: str, n: int = 2) -> list[str]:
+    """한글/영문/숫자는 단어별 문자 n-gram, 한자는 글자 단위로 자른다."""
+    tokens = [char for run in HANJA_RE.findall(text) for char in run]
+    for word in WORD_RE.findall(text.lower()):
+        if len(word) <= n:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+def compact(text: str) -> str:
+    return "".join(WORD_RE.findall(text.lower()))
+
+
+class LexicalIndex:
+    """컬렉션 문서에 대한 BM25 역색인. 첫 검색 시점에 만든다."""
+
+    def __init__(self,
+                 collection: Collecton,
+                 k1: float = 1.2,
+                 b: float = 0.75):
+        self.collection = collection
+        self.k1 = k1
+        self.b = b
+        # token -> (문서 위치 배열, 위치별 BM25 가중치 배열)
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self.ids: np.ndarray = np.empty(0, dtype=object)
+        self.docs: np.ndarray = np.empty(0, dtype=object)
+        self._fitted = False
+        self._lock = threading.Lock()
+
+    def fit(self):
+        with self._lock:
+            if self._fitted:
+                return
+            self.collection.ensure_loaded()
+            self.ids = self.collection.ids
+            self.docs = self.collection.docs
+            term_freqs = [Counter(tokenize(doc)) for doc in self.docs]
+            doc_lengths = np.array([sum(tf.values()) for tf in term_freqs],
+                                   dtype=np.float32)
+            avg_length = doc_lengths.mean() if len(doc_lengths) else 1.0
+            length_norm = self.k1 * (1 - self.b +
+                                     self.b * doc_lengths / max(avg_length, 1))
+
+            raw_postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+            for position, tf in enumerate(term_freqs):
+                for token, count in tf.items():
+                    raw_postings[token].append((position, count))
+
+            n_docs = len(self.docs)
+            for token, entries in raw_postings.items():
+                positions = np.array([p for p, _ in entries], dtype=np.int64)
+                counts = np.array([c for _, c in entries], dtype=np.float32)
+                idf = np.log(1 + (n_docs - len(entries) + 0.5) /
+                             (len(entries) + 0.5))
+                weights = idf * counts * (self.k1 + 1) / (
+                    counts + length_norm[positions])
+                self.postings[token] = (positions, weights.astype(np.float32))
+            self._fitted = True
+
+    def query(self,
+              query: str,
+              top_k: int = 30,
+              min_score: float = 0.0) -> list[Similarity]:
+        self.fit()
+        if len(self.ids) == 0 or top_k <= 0:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token in self.postings:
+                positions, weights = self.postings[token]
+                scores[positions] += weights
+
+        candidates = select_top_k(scores, np.flatnonzero(scores > min_score),
+                                  top_k)
+        return [
+            Similarity(
+                id=self.ids[i],
+                doc=self.docs[i],
+                score=float(scores[i]),
+                collection_name=f"{self.collection.name}_lexical",
+            ) for i in candidates
+        ]
+
+    @staticmethod
+    def exact_matches(query: str,
+                      similarities: list[Similarity],
+                      min_length: int = EXACT_MATCH_MIN_LENGTH
+                      ) -> list[Similarity]:
+        """질의 전체가 문서에 그대로 들어 있는 결과(예: 유물 명칭 검색)."""
+        query_key = compact(query)
+        if len(query_key) < min_length:
+            return []
+        return [sim for sim in similarities if query_key in compact(sim.doc)]
+
+
+title_lexical_index = LexicalIndex(title_collection)
+description_lexical_index = LexicalIndex(description_collection)
+content_lexical_index = LexicalIndex(content_collection)
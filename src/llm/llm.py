@@ -1,8 +1,39 @@
-from anthropic import Anthropic
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Iterator
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError
+from .clients import get_anthropic, get_async_anthropic
 from .prompt_templates import system_prompt, tool_system_prompt
+from .prompt_cache import with_cache_breakpoints, prompt_cache_stats
+from .metrics import llm_metrics
+from .batching import backoff_delay
+
+# 408 timeout, 409 conflict, 429 rate limit, 5xx(529 overloaded 포함)
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+
+def is_retryable(error: Exception) -> bool:
+    # APITimeoutError는 APIConnectionError의 하위 클래스
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code in RETRYABLE_STATUS_CODES
+        or error.status_code >= 500)
+
+class HedgeCancelled(Exception):
+    """다른 헤징 요청이 먼저 응답해 중단된 요청."""
+
+
+# 헤징 요청을 보내는 스레드 풀 (동기 호출용)
+hedge_executor = ThreadPoolExecutor(max_workers=int(
+    os.getenv("LLM_HEDGE_WORKERS", "16")))
 
 
 class LLM:
+    """Claude 호출 래퍼. 마감 시간 안에서 재시도, 헤징(LLM_HEDGE_DELAY), fallback 모델 순으로 시도한다."""
 
     _instances: dict[str, "LLM"] = {}
 
@@ -12,16 +43,338 @@ class LLM:
             cls._instances[model_name] = instance
         return cls._instances[model_name]
 
-    def __init__(self, model_name: str, system_prompt: str):
+    def __init__(self,
+                 model_name: str,
+                 system_prompt: str,
+                 fallback: "LLM | None" = None):
         if getattr(self, "_initialized", False):
             return
 
-        self.client = Anthropic()
+        # 재시도는 아래 정책이 맡으므로 SDK 자체 재시도는 끈다
+        self.client = get_anthropic().with_options(max_retries=0)
         self.model = model_name
         self.system_prompt = system_prompt
         self.tool_system_prompt = tool_system_prompt
+        self.fallback = fallback
+        self.deadline = float(os.getenv("LLM_DEADLINE", "30"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.hedge_delay = os.getenv("LLM_HEDGE_DELAY", "")
+        self.primary_deadline_fraction = float(
+            os.getenv("LLM_PRIMARY_DEADLINE_FRACTION", "0.6"))
         self._initialized = True  # 인스턴스 단위 초기화 완료 플래그
 
+    @property
+    def async_client(self) -> AsyncAnthropic:
+        # 비동기 클라이언트는 이벤트 루프별로 공유되므로 호출 시점에 가져온다
+        return get_async_anthropic().with_options(max_retries=0)
+
+    def _response_kwargs(
+        self,
+        messages: list,
+        temperature: float,
+        max_tokens: int,
+        system_prompt: str | None,
+        stop_sequences: list[str],
+    ) -> dict:
+        return dict(
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=[
+                {
+                    "type": "text",
+                    "text": system_prompt or self.system_prompt,
+                    "cache_control": {
+                        "type": "ephemeral"
+                    },
+                },
+            ],
+            messages=with_cache_breakpoints(messages),
+            model=self.model,
+            stop_sequences=stop_sequences,
+        )
+
+    def _tool_response_kwargs(
+        self,
+        messages: list,
+        temperature: float,
+        max_tokens: int,
+        tools: dict | None,
+        tool_choice: dict[str, str],
+        tool_system_prompt: str | None,
+        stop_sequences: list[str],
+    ) -> dict:
+        if not tools:
+            from llm.tools import tools as imported_tools
+
+            tools = imported_tools
+        return dict(
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=tools,
+            tool_choice=tool_choice,
+            system=[
+                {
+                    "type": "text",
+                    "text": tool_system_prompt or self.tool_system_prompt,
+                    "cache_control": {
+                        "type": "ephemeral"
+                    },
+                },
+            ],
+            messages=with_cache_breakpoints(messages),
+            model=self.model,
+            stop_sequences=stop_sequences,
+        )
+
+    def _record(
+        self,
+        call_site: str,
+        model: str,
+        started: float,
+        usage=None,
+        outcome: str = "ok",
+        first_token_at: float | None = None,
+    ):
+        llm_metrics.record(
+            call_site=call_site,
+            model=model,
+            latency=time.perf_counter() - started,
+            usage=usage,
+            outcome=outcome,
+            first_token_latency=first_token_at
+            and first_token_at - started,
+        )
+        if usage is None:
+            return
+        prompt_cache_stats.record(usage)
+        hit_ratio = prompt_cache_stats.stats()["hit_ratio"]
+        print(f"[{call_site}] {usage.model_dump_json()} "
+              f"(cache hit ratio {hit_ratio:.2f})")
+
+    @staticmethod
+    def _response_text(response) -> str:
+        try:
+            return response.content[0].text
+        except Exception as e:
+            print(f"[create_tool_response error] {response.model_dump_json()}")
+            raise e
+
+    def _hedge_delay(self, call_site: str) -> float | None:
+        if not self.hedge_delay:
+            return None
+        if self.hedge_delay == "p95":
+            return llm_metrics.latency_quantile(call_site, self.model, 0.95)
+        return float(self.hedge_delay)
+
+    def _retry_delay(self, attempt: int, error: Exception,
+                     deadline: float) -> float | None:
+        """다시 시도할 대기 시간. 재시도할 수 없거나 마감을 넘기면 None."""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return None
+        delay = backoff_delay(attempt, self.retry_base_delay)
+        if time.monotonic() + delay >= deadline:
+            return None
+        print(f"[retry {attempt + 1}/{self.max_retries}] {self.model}: {error} "
+              f"({delay:.1f}초 후 재시도)")
+        return delay
+
+    def _primary_deadline(self, deadline: float) -> float:
+        """fallback이 있으면 남은 시간의 일부만 이 모델에 주고 나머지는 fallback 몫으로 남긴다."""
+        if self.fallback is None:
+            return deadline
+        now = time.monotonic()
+        return now + max(deadline - now, 0) * self.primary_deadline_fraction
+
+    def _can_fall_back(self, error: Exception, deadline: float) -> bool:
+        return (self.fallback is not None and is_retryable(error)
+                and time.monotonic() < deadline)
+
+    def _with_fallback(self, kwargs: dict) -> tuple["LLM", dict]:
+        print(f"[fallback] {self.model} -> {self.fallback.model}")
+        return self.fallback, {**kwargs, "model": self.fallback.model}
+
+    # 동기 호출
+
+    def _attempt(self,
+                 call_site: str,
+                 kwargs: dict,
+                 deadline: float,
+                 cancelled: threading.Event | None = None):
+        started = time.perf_counter()
+        timeout = max(deadline - time.monotonic(), 0.001)
+        try:
+            if cancelled is None:
+                response = self.client.messages.create(**kwargs,
+                                                       timeout=timeout)
+            else:
+                # 헤징 요청은 스트림으로 받아, 진 쪽은 연결을 끊어 생성(과금)을 멈춘다
+                with self.client.messages.stream(**kwargs,
+                                                 timeout=timeout) as stream:
+                    for _ in stream:
+                        if cancelled.is_set():
+                            raise HedgeCancelled()
+                    response = stream.get_final_message()
+        except Exception as e:
+            self._record(call_site, kwargs["model"], started,
+                         outcome=type(e).__name__)
+            raise e
+        self._record(call_site, kwargs["model"], started, response.usage)
+        return response
+
+    def _hedged(self, call_site: str, kwargs: dict, deadline: float):
+        hedge_delay = self._hedge_delay(call_site)
+        if hedge_delay is None or time.monotonic() + hedge_delay >= deadline:
+            return self._attempt(call_site, kwargs, deadline)
+        cancelled = threading.Event()
+        futures = [
+            hedge_executor.submit(self._attempt, call_site, kwargs, deadline,
+                                  cancelled)
+        ]
+        try:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.append(
+                    hedge_executor.submit(self._attempt, call_site, kwargs,
+                                          deadline, cancelled))
+            # 먼저 성공한 응답을 쓰고, 모두 실패하면 첫 요청의 오류를 올린다
+            for future in as_completed(futures):
+                if future.exception() is None:
+                    return future.result()
+            raise futures[0].exception()
+        finally:
+            cancelled.set()
+            for future in futures:
+                future.cancel()  # 아직 풀에서 기다리는 요청은 보내지 않는다
+
+    def _call(self,
+              call_site: str,
+              kwargs: dict,
+              timeout: float | None,
+              deadline: float | None = None):
+        deadline = deadline or time.monotonic() + (timeout or self.deadline)
+        attempt_deadline = self._primary_deadline(deadline)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._hedged(call_site, kwargs, attempt_deadline)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, attempt_deadline)
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+                if not self._can_fall_back(e, deadline):
+                    raise e
+                fallback, fallback_kwargs = self._with_fallback(kwargs)
+                return fallback._call(call_site, fallback_kwargs, timeout,
+                                      deadline)
+
+    # 비동기 호출
+
+    async def _aattempt(self, call_site: str, kwargs: dict, deadline: float):
+        started = time.perf_counter()
+        try:
+            response = await self.async_client.messages.create(
+                **kwargs, timeout=max(deadline - time.monotonic(), 0.001))
+        except Exception as e:
+            self._record(call_site, kwargs["model"], started,
+                         outcome=type(e).__name__)
+            raise e
+        self._record(call_site, kwargs["model"], started, response.usage)
+        return response
+
+    async def _ahedged(self, call_site: str, kwargs: dict, deadline: float):
+        hedge_delay = self._hedge_delay(call_site)
+        if hedge_delay is None or time.monotonic() + hedge_delay >= deadline:
+            return await self._aattempt(call_site, kwargs, deadline)
+        tasks = [
+            asyncio.create_task(self._aattempt(call_site, kwargs, deadline))
+        ]
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            tasks.append(
+                asyncio.create_task(
+                    self._aattempt(call_site, kwargs, deadline)))
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception:
+                    continue
+            return await tasks[0]  # 모두 실패: 첫 요청의 오류를 올린다
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _acall(self,
+                     call_site: str,
+                     kwargs: dict,
+                     timeout: float | None,
+                     deadline: float | None = None):
+        deadline = deadline or time.monotonic() + (timeout or self.deadline)
+        attempt_deadline = self._primary_deadline(deadline)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._ahedged(call_site, kwargs,
+                                           attempt_deadline)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, attempt_deadline)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+                if not self._can_fall_back(e, deadline):
+                    raise e
+                fallback, fallback_kwargs = self._with_fallback(kwargs)
+                return await fallback._acall(call_site, fallback_kwargs,
+                                             timeout, deadline)
+
+    # 스트리밍
+
+    def _stream(self,
+                call_site: str,
+                kwargs: dict,
+                timeout: float | None,
+                deadline: float | None = None) -> Iterator[str]:
+        # 스트리밍에서 timeout은 청크 사이 읽기 제한이므로 곧 첫 토큰까지의 마감이다
+        deadline = deadline or time.monotonic() + (timeout or self.deadline)
+        attempt_deadline = self._primary_deadline(deadline)
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            first_token_at = None
+            try:
+                with self.client.messages.stream(
+                        **kwargs,
+                        timeout=max(attempt_deadline - time.monotonic(),
+                                    0.001)) as stream:
+                    for text in stream.text_stream:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield text
+                    self._record(call_site,
+                                 kwargs["model"],
+                                 started,
+                                 stream.get_final_message().usage,
+                                 first_token_at=first_token_at)
+                return
+            except Exception as e:
+                self._record(call_site,
+                             kwargs["model"],
+                             started,
+                             outcome=type(e).__name__,
+                             first_token_at=first_token_at)
+                # 이미 화면에 나간 텍스트가 있으면 다시 보낼 수 없다
+                if first_token_at is not None:
+                    raise e
+                delay = self._retry_delay(attempt, e, attempt_deadline)
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+                if not self._can_fall_back(e, deadline):
+                    raise e
+                fallback, fallback_kwargs = self._with_fallback(kwargs)
+                yield from fallback._stream(call_site, fallback_kwargs,
+                                            timeout, deadline)
+                return
+
     def create_response(
         self,
         messages: list,
@@ -29,30 +382,41 @@ class LLM:
         max_tokens: int = 2048,
         system_prompt: str | None = None,
         stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
     ):
         try:
-            response = self.client.messages.create(
-                max_tokens=max_tokens,
-                temperature=temperature,
-                system=[
-                    {
-                        "type": "text",
-                        "text": system_prompt or self.system_prompt,
-                        "cache_control": {
-                            "type": "ephemeral"
-                        },
-                    },
-                ],
-                messages=messages,
-                model=self.model,
-                stop_sequences=stop_sequences,
+            return self._call(
+                call_site,
+                self._response_kwargs(messages, temperature, max_tokens,
+                                      system_prompt, stop_sequences),
+                timeout,
             )
-            print(response.usage.model_dump_json())
-            return response
         except Exception as e:
             print(f"[create_response error] {e}")
             raise e
 
+    async def acreate_response(
+        self,
+        messages: list,
+        temperature: float = 0,
+        max_tokens: int = 2048,
+        system_prompt: str | None = None,
+        stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
+    ):
+        try:
+            return await self._acall(
+                call_site,
+                self._response_kwargs(messages, temperature, max_tokens,
+                                      system_prompt, stop_sequences),
+                timeout,
+            )
+        except Exception as e:
+            print(f"[acreate_response error] {e}")
+            raise e
+
     def create_response_text(
         self,
         messages: list,
@@ -60,6 +424,8 @@ class LLM:
         max_tokens: int = 2048,
         system_prompt: str | None = None,
         stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
     ) -> str:
         response = self.create_response(
             messages=messages,
@@ -67,11 +433,52 @@ class LLM:
             max_tokens=max_tokens,
             system_prompt=system_prompt,
             stop_sequences=stop_sequences,
+            call_site=call_site,
+            timeout=timeout,
+        )
+        return self._response_text(response)
+
+    async def acreate_response_text(
+        self,
+        messages: list,
+        temperature: float = 0.5,
+        max_tokens: int = 2048,
+        system_prompt: str | None = None,
+        stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
+    ) -> str:
+        response = await self.acreate_response(
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            system_prompt=system_prompt,
+            stop_sequences=stop_sequences,
+            call_site=call_site,
+            timeout=timeout,
         )
+        return self._response_text(response)
+
+    def stream_response_text(
+        self,
+        messages: list,
+        temperature: float = 0.5,
+        max_tokens: int = 2048,
+        system_prompt: str | None = None,
+        stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
+    ) -> Iterator[str]:
+        """create_response_text와 같은 요청을 스트리밍으로 보내 텍스트 조각을 yield한다."""
         try:
-            return response.content[0].text
+            yield from self._stream(
+                call_site,
+                self._response_kwargs(messages, temperature, max_tokens,
+                                      system_prompt, stop_sequences),
+                timeout,
+            )
         except Exception as e:
-            print(f"[create_tool_response error] {response.model_dump_json()}")
+            print(f"[stream_response_text error] {e}")
             raise e
 
     def create_tool_response(
@@ -83,39 +490,51 @@ class LLM:
         tool_choice: dict[str, str] = {"type": "auto"},
         tool_system_prompt: str | None = None,
         stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
     ):
-        if not tools:
-            from llm.tools import tools as imported_tools
+        try:
+            return self._call(
+                call_site,
+                self._tool_response_kwargs(messages, temperature, max_tokens,
+                                           tools, tool_choice,
+                                           tool_system_prompt,
+                                           stop_sequences),
+                timeout,
+            )
+        except Exception as e:
+            print(f"[LLM ERROR] {e}")
+            raise e
 
-            tools = imported_tools
+    async def acreate_tool_response(
+        self,
+        messages: list,
+        temperature: float = 0,
+        max_tokens: int = 2048,
+        tools: dict | None = None,
+        tool_choice: dict[str, str] = {"type": "auto"},
+        tool_system_prompt: str | None = None,
+        stop_sequences: list[str] = [],
+        call_site: str = "default",
+        timeout: float | None = None,
+    ):
         try:
-            response = self.client.messages.create(
-                max_tokens=max_tokens,
-                temperature=temperature,
-                tools=tools,
-                tool_choice=tool_choice,
-                system=[
-                    {
-                        "type": "text",
-                        "text": tool_system_prompt or self.tool_system_prompt,
-                        "cache_control": {
-                            "type": "ephemeral"
-                        },
-                    },
-                ],
-                messages=messages,
-                model=self.model,
-                stop_sequences=stop_sequences,
+            return await self._acall(
+                call_site,
+                self._tool_response_kwargs(messages, temperature, max_tokens,
+                                           tools, tool_choice,
+                                           tool_system_prompt,
+                                           stop_sequences),
+                timeout,
             )
-            print(response.usage.model_dump_json())
-            return response
         except Exception as e:
             print(f"[LLM ERROR] {e}")
             raise e
 
 
-# 모델별 싱글턴 인스턴스 생성
-claude_3_7 = LLM(model_name="claude-3-7-sonnet-20250219",
-                 system_prompt=system_prompt)
+# 모델별 싱글턴 인스턴스 생성. claude_3_7이 마감을 넘기면 claude_3_5로 넘어간다
 claude_3_5 = LLM(model_name="claude-3-5-sonnet-20240620",
                  system_prompt=system_prompt)
+claude_3_7 = LLM(model_name="claude-3-7-sonnet-20250219",
+                 system_prompt=system_prompt,
+                 fallback=claude_3_5)
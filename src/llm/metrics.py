@@ -0,0 +1,189 @@
+"""
+모델 호출별 지연 시간과 토큰 사용량. LLM_METRICS_JSONL, LLM_METRICS_PORT(Prometheus)로 내보낸다.
+"""
+
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import json
+import os
+import threading
+import time
+
+# 초 단위 지연 시간 버킷 (Prometheus le 경계)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens",
+                "cache_creation_input_tokens")
+
+
+class Histogram:
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 마지막 칸은 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """버킷 상한으로 근사한 분위수."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class LLMMetrics:
+
+    def __init__(self, jsonl_path: str | None = None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        # (call_site, model, outcome) -> 히스토그램 / 토큰 합계
+        self.latency: dict[tuple, Histogram] = defaultdict(Histogram)
+        self.first_token_latency: dict[tuple, Histogram] = defaultdict(
+            Histogram)
+        self.tokens: dict[tuple, dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(TOKEN_FIELDS, 0))
+
+    def record(
+        self,
+        call_site: str,
+        model: str,
+        latency: float,
+        usage=None,
+        outcome: str = "ok",
+        first_token_latency: float | None = None,
+    ):
+        labels = (call_site, model, outcome)
+        tokens = {
+            field: (getattr(usage, field, None) or 0) if usage else 0
+            for field in TOKEN_FIELDS
+        }
+        with self._lock:
+            self.latency[labels].observe(latency)
+            if first_token_latency is not None:
+                self.first_token_latency[labels].observe(first_token_latency)
+            for field, value in tokens.items():
+                self.tokens[labels][field] += value
+            if self.jsonl_path:
+                record = {
+                    "time": time.time(),
+                    "call_site": call_site,
+                    "model": model,
+                    "outcome": outcome,
+                    "latency": round(latency, 4),
+                    "first_token_latency": first_token_latency
+                    and round(first_token_latency, 4),
+                    **tokens,
+                }
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def latency_quantile(self,
+                         call_site: str,
+                         model: str,
+                         q: float,
+                         min_count: int = 20) -> float | None:
+        """성공한 호출의 지연 시간 분위수. 표본이 부족하면 None."""
+        with self._lock:
+            histogram = self.latency.get((call_site, model, "ok"))
+            if histogram is None or histogram.count < min_count:
+                return None
+            return histogram.quantile(q)
+
+    def summary(self) -> list[dict]:
+        """call site별 호출 수, p50/p99 지연 시간과 토큰 합계."""
+        with self._lock:
+            return [{
+                "call_site": call_site,
+                "model": model,
+                "outcome": outcome,
+                "count": histogram.count,
+                "p50": histogram.quantile(0.5),
+                "p99": histogram.quantile(0.99),
+                **self.tokens[(call_site, model, outcome)],
+            } for (call_site, model, outcome), histogram in
+                    self.latency.items()]
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, histograms in (
+                ("llm_call_latency_seconds", self.latency),
+                ("llm_first_token_latency_seconds", self.first_token_latency),
+            ):
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in histograms.items():
+                    label_str = self._labels(labels)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets,
+                                            histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label_str},le="{bound}"}}'
+                                     f" {cumulative}")
+                    lines.append(f'{name}_bucket{{{label_str},le="+Inf"}}'
+                                 f" {histogram.count}")
+                    lines.append(f"{name}_sum{{{label_str}}} {histogram.sum}")
+                    lines.append(
+                        f"{name}_count{{{label_str}}} {histogram.count}")
+            lines.append("# TYPE llm_tokens_total counter")
+            for labels, tokens in self.tokens.items():
+                label_str = self._labels(labels)
+                for field, value in tokens.items():
+                    lines.append(f'llm_tokens_total{{{label_str},'
+                                 f'type="{field}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        call_site, model, outcome = labels
+        return (f'call_site="{call_site}",model="{model}",'
+                f'outcome="{outcome}"')
+
+    def serve(self,
+              port: int,
+              host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """/metrics 엔드포인트를 데몬 스레드로 띄운다."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+llm_metrics = LLMMetrics(jsonl_path=os.getenv("LLM_METRICS_JSONL"))
+
+_metrics_port = os.getenv("LLM_METRICS_PORT")
+if _metrics_port:
+    try:
+        llm_metrics.serve(int(_metrics_port),
+                          host=os.getenv("LLM_METRICS_HOST", "127.0.0.1"))
+    except OSError as e:
+        # Streamlit이 모듈을 다시 읽는 경우 등 이미 포트가 열려 있으면 무시
+        print(f"[metrics] /metrics 엔드포인트를 열지 못함: {e}")
@@ -0,0 +1,201 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from utils import project_root
+from utils.storage import LRUCache, atomic_write_text
+from functools import lru_cache
+from .prompt_templates import (
+    system_prompt,
+    guide_instruction,
+    guide_program_prompt,
+)
+
+# 사전 생성 해설 파일의 형식 버전. 형식이 바뀌면 올린다.
+ARTIFACT_VERSION = 1
+default_artifact_path = project_root / "data" / "narrations" / "narrations.json"
+
+
+def template_hash(*templates: str) -> str:
+    joined = "\x00".join(templates)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=8)
+def guide_prompt_hash(model: str) -> str:
+    """전시물 해설 프롬프트(시스템 프롬프트, 관람 프로그램, 안내 지시문, 모델)의 해시.
+
+    DocentBot은 대화 맨 앞에 관람 프로그램 메시지를 넣으므로 그 내용도 포함한다.
+    """
+    guide_program_path = project_root / "data" / "guide_program.json"
+    guide_program = (guide_program_path.read_text(encoding="utf-8")
+                     if guide_program_path.exists() else "")
+    return template_hash(system_prompt, guide_program_prompt, guide_program,
+                         guide_instruction, model)
+
+
+class NarrationCache:
+    """(relic_id, 프롬프트 해시)마다 n_variants개의 해설이 모이면 그중 하나를 무작위로 돌려준다."""
+
+    def __init__(
+        self,
+        n_variants: int = 3,
+        ttl_seconds: float | None = 7 * 24 * 3600,
+        max_size: int = 2048,
+        cache_dir: str | Path | None = None,
+        enabled: bool = True,
+    ):
+        self.n_variants = n_variants
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.enabled = enabled
+        # key -> [(생성 시각, 해설), ...]
+        self._memory: LRUCache[str, list[tuple[float, str]]] = LRUCache(
+            max_size, on_evict=self._forget_preloaded)
+        # 사전 생성 해설로 채운 key. n_variants보다 적어도 다 모인 것으로 본다
+        self._preloaded: set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(relic_id: str, prompt_hash: str) -> str:
+        return f"{relic_id}:{prompt_hash}"
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            variants = self._variants(key)
+            if variants and key not in self._memory:
+                # 디스크에서 읽은 해설은 메모리에 올려 다음에는 파일을 읽지 않는다
+                self._memory.put(key, variants)
+            if not variants or (len(variants) < self.n_variants
+                                and key not in self._preloaded):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return random.choice(variants)[1]
+
+    def put(self, key: str, narration: str):
+        if not self.enabled or not narration:
+            return
+        with self._lock:
+            variants = self._variants(key)
+            variants.append((time.time(), narration))
+            del variants[:-self.n_variants]
+            self._memory.put(key, variants)
+        self._save_to_disk(key, variants)
+
+    def preload(self, key: str, narrations: list[str]):
+        """사전 생성된 해설을 메모리에 채운다. 디스크에는 쓰지 않는다."""
+        if not self.enabled or not narrations:
+            return
+        now = time.time()
+        with self._lock:
+            variants = self._variants(key)
+            variants.extend((now, text) for text in narrations if text)
+            del variants[:-self.n_variants]
+            self._memory.put(key, variants)
+            self._preloaded.add(key)
+
+    def load_artifact(self, path: str | Path, model: str) -> int:
+        """narration 사전 생성 결과를 읽어 캐시에 채우고, 채운 전시물 수를 돌려준다.
+
+        형식 버전이나 프롬프트 해시가 다르면 오래된 해설이므로 무시한다.
+        """
+        path = Path(path)
+        if not self.enabled or not path.exists():
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[narration cache] 사전 생성 해설 파일 무시: {path} ({e})")
+            return 0
+        prompt_hash = guide_prompt_hash(model)
+        if (artifact.get("version") != ARTIFACT_VERSION
+                or artifact.get("prompt_hash") != prompt_hash):
+            print(f"[narration cache] 버전 또는 프롬프트가 달라 무시: {path}")
+            return 0
+        for relic_id, narrations in artifact.get("narrations", {}).items():
+            self.preload(self.key(relic_id, prompt_hash), narrations)
+        return len(artifact.get("narrations", {}))
+
+    def invalidate(self, key: str | None = None):
+        """key가 없으면 전체를 비운다."""
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+                self._preloaded.clear()
+            else:
+                self._memory.pop(key)
+                self._preloaded.discard(key)
+        if self.cache_dir:
+            paths = ([self._disk_path(key)] if key is not None else
+                     list(self.cache_dir.glob("*.json")))
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+    def _variants(self, key: str) -> list[tuple[float, str]]:
+        """만료되지 않은 해설 목록. 메모리에 없으면 디스크에서 읽는다."""
+        variants = self._memory.get(key)
+        if variants is None:
+            variants = self._load_from_disk(key)
+        if self.ttl_seconds is not None:
+            expire_before = time.time() - self.ttl_seconds
+            variants = [v for v in variants if v[0] >= expire_before]
+        return variants
+
+    def _forget_preloaded(self, key: str):
+        # self._lock을 잡은 put/preload 안에서만 불린다
+        self._preloaded.discard(key)
+
+    def _disk_path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def _load_from_disk(self, key: str) -> list[tuple[float, str]]:
+        if not self.cache_dir:
+            return []
+        path = self._disk_path(key)
+        if not path.exists():
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [(created_at, text) for created_at, text in json.load(f)]
+        except (OSError, ValueError) as e:
+            print(f"[narration cache] 손상된 캐시 파일 무시: {path} ({e})")
+            return []
+
+    def _save_to_disk(self, key: str, variants: list[tuple[float, str]]):
+        if not self.cache_dir:
+            return
+        atomic_write_text(self._disk_path(key),
+                          json.dumps(variants, ensure_ascii=False))
+
+
+ttl_hours = os.getenv("NARRATION_CACHE_TTL_HOURS", "168")
+narration_cache = NarrationCache(
+    n_variants=int(os.getenv("NARRATION_CACHE_VARIANTS", "3")),
+    ttl_seconds=float(ttl_hours) * 3600 if ttl_hours else None,
+    cache_dir=os.getenv("NARRATION_CACHE_DIR"),
+    enabled=os.getenv("NARRATION_CACHE", "on").lower()
+    not in ("off", "0", "false"),
+)
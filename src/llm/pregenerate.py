@@ -0,0 +1,146 @@
+"""
+모든 전시물의 해설을 미리 생성해 data/narrations/narrations.json에 저장한다.
+다시 실행하면 이어서 진행하고, 실패한 전시물은 failures에 남겨 다음에 재시도한다.
+
+    cd src && python -m llm.pregenerate --concurrency 4 --variants 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from utils import project_root
+from utils.storage import atomic_write_text
+from .llm import claude_3_7 as claude
+from .docent import Relics, SearchedRelics, InstructionHandler
+from .narration_cache import (
+    ARTIFACT_VERSION,
+    default_artifact_path,
+    guide_prompt_hash,
+    narration_cache,
+)
+
+
+def load_artifact(path: Path, prompt_hash: str) -> dict:
+    """이어서 진행할 수 있는 기존 결과가 있으면 읽고, 없으면 새로 만든다."""
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "model": claude.model,
+        "prompt_hash": prompt_hash,
+        "created_at": time.time(),
+        "narrations": {},
+        "failures": {},
+    }
+    if not path.exists():
+        return artifact
+    with open(path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    if (previous.get("version") != ARTIFACT_VERSION
+            or previous.get("prompt_hash") != prompt_hash):
+        print(f"버전 또는 프롬프트가 달라 처음부터 생성: {path}")
+        return artifact
+    artifact.update(previous)
+    return artifact
+
+
+def save_artifact(path: Path, artifact: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    artifact["updated_at"] = time.time()
+    atomic_write_text(path, json.dumps(artifact, ensure_ascii=False, indent=2))
+
+
+def guide_messages(relics: Relics, relic_id: str) -> list:
+    """전시물 하나만 담은 SearchedRelics로 DocentBot과 같은 메시지를 만든다."""
+    single = SearchedRelics({relic_id: relics.database[relic_id]}, relics)
+    single.index = 0
+    messages = []
+    instruction = InstructionHandler()
+    instruction.add_guide_program(messages)
+    instruction.add_guide(single, messages)
+    return messages
+
+
+async def generate_relic(relics: Relics, relic_id: str, n_variants: int,
+                         existing: list[str]) -> list[str]:
+    messages = await asyncio.to_thread(guide_messages, relics, relic_id)
+    narrations = list(existing)
+    while len(narrations) < n_variants:
+        narrations.append(await claude.acreate_response_text(
+            messages=messages, call_site="pregenerate"))
+    return narrations
+
+
+async def pregenerate(
+    path: Path = default_artifact_path,
+    concurrency: int = 4,
+    n_variants: int = narration_cache.n_variants,
+    relic_ids: list[str] | None = None,
+    save_every: int = 10,
+) -> dict:
+    relics = Relics()
+    artifact = load_artifact(path, guide_prompt_hash(claude.model))
+    narrations: dict = artifact["narrations"]
+    failures: dict = artifact["failures"]
+
+    targets = [
+        relic_id for relic_id in (relic_ids or relics.ids)
+        if len(narrations.get(relic_id, [])) < n_variants
+    ]
+    print(f"전체 {len(relics.ids)}건 중 {len(targets)}건 생성 "
+          f"(완료 {len(narrations)}건, 이전 실패 {len(failures)}건)")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def run(relic_id: str):
+        nonlocal done
+        async with semaphore:
+            try:
+                narrations[relic_id] = await generate_relic(
+                    relics, relic_id, n_variants,
+                    narrations.get(relic_id, []))
+                failures.pop(relic_id, None)
+            except Exception as e:
+                failures[relic_id] = f"{type(e).__name__}: {e}"
+                print(f"[pregenerate] {relic_id} 실패: {failures[relic_id]}")
+        # 이벤트 루프 스레드에서만 저장하므로 별도 잠금이 필요 없다
+        done += 1
+        if done % save_every == 0:
+            save_artifact(path, artifact)
+            print(f"{done}/{len(targets)}건 처리")
+
+    await asyncio.gather(*(run(relic_id) for relic_id in targets))
+    save_artifact(path, artifact)
+    print(f"완료 {len(narrations)}건, 실패 {len(failures)}건 -> {path}")
+    return artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="전시물 해설 사전 생성")
+    parser.add_argument("--output", type=Path, default=default_artifact_path)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--variants",
+                        type=int,
+                        default=narration_cache.n_variants)
+    parser.add_argument("--relic-ids", nargs="*", default=None)
+    parser.add_argument("--save-every", type=int, default=10)
+    args = parser.parse_args()
+    output = args.output.resolve()
+    # Relics와 add_guide는 프로젝트 루트 기준 상대 경로(data/...)를 쓴다
+    os.chdir(project_root)
+    artifact = asyncio.run(
+        pregenerate(
+            path=output,
+            concurrency=args.concurrency,
+            n_variants=args.variants,
+            relic_ids=args.relic_ids,
+            save_every=args.save_every,
+        ))
+    if artifact["failures"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+요청 사본의 메시지에 프롬프트 캐시 중단점(cache_control)을 둔다.
+"""
+
+import copy
+import threading
+
+# API 한도 4개 중 하나는 시스템 프롬프트가 쓴다
+MAX_MESSAGE_BREAKPOINTS = 3
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def is_guide_message(message: dict) -> bool:
+    content = message["content"]
+    return (isinstance(content, list) and any(
+        block.get("type") == "text" and "<relic_information>" in block["text"]
+        for block in content))
+
+
+def breakpoint_positions(messages: list,
+                         max_breakpoints: int = MAX_MESSAGE_BREAKPOINTS
+                         ) -> list[int]:
+    if not messages or max_breakpoints <= 0:
+        return []
+    # 마지막 메시지와, 다음 전시물로 넘어가도 그대로 남는 현재 안내 메시지 직전
+    positions = [len(messages) - 1]
+    for idx in reversed(range(len(messages))):
+        if is_guide_message(messages[idx]):
+            if idx > 0:
+                positions.append(idx - 1)
+            break
+    return sorted(set(positions))[-max_breakpoints:]
+
+
+def with_cache_breakpoints(
+        messages: list,
+        max_breakpoints: int = MAX_MESSAGE_BREAKPOINTS) -> list:
+    """중단점을 표시한 메시지 목록의 사본을 돌려준다."""
+    positions = breakpoint_positions(messages, max_breakpoints)
+    if not positions:
+        return messages
+    messages = list(messages)
+    for idx in positions:
+        message = messages[idx]
+        content = message["content"]
+        if isinstance(content, str):
+            if not content.strip():
+                continue
+            content = [{"type": "text", "text": content}]
+        else:
+            content = copy.copy(content)
+        if not content:
+            continue
+        content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
+        messages[idx] = {**message, "content": content}
+    return messages
+
+
+class PromptCacheStats:
+    """응답 usage의 캐시 읽기/쓰기 토큰을 누적해 적중률을 계산한다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+
+    def record(self, usage):
+        with self._lock:
+            self.input_tokens += usage.input_tokens or 0
+            self.cache_read_tokens += getattr(usage,
+                                              "cache_read_input_tokens",
+                                              None) or 0
+            self.cache_creation_tokens += getattr(
+                usage, "cache_creation_input_tokens", None) or 0
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            total = (self.input_tokens + self.cache_read_tokens +
+                     self.cache_creation_tokens)
+            return {
+                "input_tokens": self.input_tokens,
+                "cache_read_tokens": self.cache_read_tokens,
+                "cache_creation_tokens": self.cache_creation_tokens,
+                "hit_ratio": self.cache_read_tokens / total if total else 0.0,
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,91 @@
+from pathlib import Path
+import numpy as np
+
+QUANTIZATION_DTYPES = ("float16", "int8")
+
+
+class QuantizedMatrix:
+    """정규화된 임베딩 행렬의 float16 또는 int8(차원별 scale, 대칭) 압축 표현."""
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scale: np.ndarray | None = None,
+        inv_norms: np.ndarray | None = None,
+        signature: str = "",
+    ):
+        self.codes = codes
+        self.scale = scale
+        self.inv_norms = inv_norms
+        self.signature = signature
+
+    @property
+    def dtype(self) -> str:
+        return str(self.codes.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scale is None else
+                                    self.scale.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_vectors(
+        cls,
+        vectors: np.ndarray,
+        dtype: str = "int8",
+        inv_norms: np.ndarray | None = None,
+        signature: str = "",
+    ) -> "QuantizedMatrix":
+        """vectors는 행 단위로 정규화되어 있어야 한다."""
+        if dtype not in QUANTIZATION_DTYPES:
+            raise ValueError(f"지원하지 않는 양자화 형식입니다: {dtype}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dtype == "float16":
+            return cls(vectors.astype(np.float16),
+                       inv_norms=inv_norms,
+                       signature=signature)
+        scale = np.abs(vectors).max(axis=0) / 127
+        scale[scale == 0] = 1
+        codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+        return cls(codes,
+                   scale.astype(np.float32),
+                   inv_norms=inv_norms,
+                   signature=signature)
+
+    def scores(self,
+               query_vector: np.ndarray,
+               rows: np.ndarray | None = None,
+               chunk_size: int = 1024) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        # (codes * scale) @ q == codes @ (scale * q)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self.scale is not None:
+            query_vector = self.scale * query_vector
+        # BLAS는 float32만 쓰므로 청크 단위로 변환해 임시 메모리를 제한
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), chunk_size):
+            chunk = codes[start:start + chunk_size].astype(np.float32)
+            scores[start:start + chunk_size] = chunk @ query_vector
+        return scores
+
+    def save(self, path: str | Path):
+        arrays = {"codes": self.codes, "signature": np.str_(self.signature)}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        if self.inv_norms is not None:
+            arrays["inv_norms"] = self.inv_norms
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "QuantizedMatrix":
+        with np.load(path) as data:
+            return cls(
+                codes=data["codes"],
+                scale=data["scale"] if "scale" in data else None,
+                inv_norms=data["inv_norms"] if "inv_norms" in data else None,
+                signature=str(data["signature"])
+                if "signature" in data else "",
+            )
@@ -0,0 +1,124 @@
+"""
+검색 후보 중 질의에 맞는 전시물만 남긴다. RERANK_MODE=local(기본) 또는 llm.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from .vector_search import Similarity, filter_results
+from .lexical_search import EXACT_MATCH_MIN_LENGTH, compact, tokenize
+
+
+class Reranker(ABC):
+
+    @abstractmethod
+    def rerank(
+        self,
+        query: str,
+        user_message: str,
+        groups: list[list[Similarity]],
+        database: dict,
+    ) -> list[Similarity]:
+        """groups는 점수 척도가 같은 후보끼리 묶은 목록(예: 제목 RRF, 설명/본문 RRF)."""
+
+
+class LocalReranker(Reranker):
+
+    def __init__(
+        self,
+        min_overlap: float = 0.5,
+        weak_overlap: float = 0.2,
+        min_relative_score: float = 0.8,
+        margin: float = 1.2,
+        min_exact_length: int = EXACT_MATCH_MIN_LENGTH,
+    ):
+        self.min_overlap = min_overlap
+        self.weak_overlap = weak_overlap
+        self.min_relative_score = min_relative_score
+        self.margin = margin
+        self.min_exact_length = min_exact_length
+
+    @staticmethod
+    def relic_text(relic: dict) -> str:
+        label = relic.get("label", {})
+        category = relic.get("category", {})
+        return " ".join(
+            [*map(str, label.values()), *map(str, category.values())])
+
+    @staticmethod
+    def overlap(query_tokens: set[str], text: str) -> float:
+        if not query_tokens:
+            return 0.0
+        return len(query_tokens & set(tokenize(text))) / len(query_tokens)
+
+    def rerank(self, query, user_message, groups, database):
+        query_key = compact(query)
+        query_tokens = set(tokenize(query))
+
+        # 명칭을 그대로 말한 경우 그 전시물만 돌려준다
+        exact = [
+            sim for group in groups for sim in group
+            if sim.id in database and len(query_key) >= self.min_exact_length
+            and query_key in compact(database[sim.id]["label"]["명칭"])
+        ]
+        if exact:
+            return self._dedupe(exact)
+
+        accepted = []
+        for group in groups:
+            ranked = sorted((sim for sim in group if sim.id in database),
+                            key=lambda sim: sim.score,
+                            reverse=True)
+            if not ranked:
+                continue
+            top_score = ranked[0].score or 1.0
+            runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+            for rank, sim in enumerate(ranked):
+                overlap = self.overlap(
+                    query_tokens,
+                    self.relic_text(database[sim.id]) + " " + sim.doc)
+                relative_score = sim.score / top_score
+                is_clear_winner = (rank == 0
+                                   and top_score >= self.margin * runner_up)
+                if (overlap >= self.min_overlap
+                        or (relative_score >= self.min_relative_score
+                            and overlap >= self.weak_overlap)
+                        or is_clear_winner):
+                    accepted.append(sim)
+        return self._dedupe(accepted)
+
+    @staticmethod
+    def _dedupe(similarities: list[Similarity]) -> list[Similarity]:
+        seen = set()
+        unique = []
+        for sim in similarities:
+            if sim.id not in seen:
+                seen.add(sim.id)
+                unique.append(sim)
+        return unique
+
+
+class LLMReranker(Reranker):
+
+    def __init__(self, fallback: Reranker | None = None):
+        self.fallback = fallback or LocalReranker()
+
+    def rerank(self, query, user_message, groups, database):
+        similarities = [sim for group in groups for sim in group]
+        if not similarities:
+            return []
+        try:
+            return filter_results(similarities, user_message)
+        except (ValueError, KeyError) as e:
+            # json.JSONDecodeError는 ValueError의 하위 클래스
+            print(f"[rerank] LLM 응답을 해석하지 못해 local 결과 사용: {e}")
+            return self.fallback.rerank(query, user_message, groups, database)
+
+
+RERANKERS = {"local": LocalReranker, "llm": LLMReranker}
+
+
+def get_reranker(mode: str | None = None) -> Reranker:
+    mode = mode or os.getenv("RERANK_MODE", "local")
+    if mode not in RERANKERS:
+        raise ValueError(f"지원하지 않는 rerank 모드입니다: {mode}")
+    return RERANKERS[mode]()
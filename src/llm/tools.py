@@ -1,6 +1,3 @@
-from tavily import TavilyClient
-from anthropic import Anthropic
-import os
 from typing import Literal
 from pydantic import BaseModel, Field
 from .prompt_templates import history_based_prompt
@@ -10,16 +7,30 @@ from .vector_search import (
     content_collection,
     description_collection,
     get_rrf,
-    filter_results,
+    query_collections,
 )
+from .lexical_search import (
+    LexicalIndex,
+    title_lexical_index,
+    description_lexical_index,
+    content_lexical_index,
+)
+from .batching import RETRYABLE_ERRORS
+from .rerank import get_reranker
+from .catalog import category_index_for
+from .category_index import CategoryIndex
+from .clients import get_tavily
 
-client = Anthropic()
-tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+tavily = get_tavily()
+reranker = get_reranker()
 
 
 class Category(BaseModel):
-    nationality: str = Field(description="예: 한국, 중국, 일본")
-    period: str = Field(description="예: 신라, 고려, 조선. 단, 통일신라는 '신라'로 표기")
+    nationality: str = Field(default="전체",
+                             description="예: 한국, 중국, 일본. 조건이 없으면 '전체'")
+    period: str = Field(
+        default="전체",
+        description="예: 신라, 고려, 조선. 단, 통일신라는 '신라'로 표기. 조건이 없으면 '전체'")
     genre: Literal[
         "건축",
         "조각(불상)",
@@ -31,13 +42,14 @@ class Category(BaseModel):
         "복식",
         "과학기술",
         "기타",
-    ]
+        "전체",
+    ] = Field(default="전체", description="조건이 없으면 '전체'")
 
 
 tools = [
     {
         "name": "search_relics_by_period_and_genre",
-        "description": "'시대'와 '전시물'로 검색 요청하는 경우에 한해 사용할 것",
+        "description": "'시대'나 '장르'로 검색 요청하는 경우에 한해 사용할 것",
         "input_schema": Category.model_json_schema(),
     },
     {
@@ -71,31 +83,70 @@ tools = [
 
 
 def search_relics_by_period_and_genre(search_condition: dict, database: dict):
+    category_index = category_index_for(database)
     results = {}
-    for relic_id, relic_data in database.items():
-        relic_category: dict = relic_data["category"]
-        if relic_category == search_condition:
-            results[relic_id] = relic_data
-            results[relic_id]["is_presented"] = False
+    for relic_id in category_index.search(search_condition):
+        results[relic_id] = database[relic_id]
     message = (f"요청하신 전시물이 {len(results)}점 검색되었습니다. [다음] 버튼을 클릭해주세요."
                if len(results) > 0 else "요청하신 전시물의 검색 결과가 없습니다.")
+    # 장르나 시대를 지정하지 않은 경우 결과의 구성을 함께 알려준다
+    facets = category_index.facets(list(results))
+    for field, label in (("genre", "장르"), ("period", "시대")):
+        if len(facets[field]) > 1:
+            counts = ", ".join(f"{value} {count}점"
+                               for value, count in facets[field].most_common())
+            message += f" ({label}별: {counts})"
+            break
     return results, message
 
 
 def search_relics_without_period_and_genre(query: str, database: dict,
                                            user_message: str):
-    title_similarities = title_collection.query(query, top_k=5)
-    description_similarities = description_collection.query(query, top_k=30)
-    content_similarities = content_collection.query(query, top_k=30)
-    desc_cntn_similarities = get_rrf(
-        [description_similarities, content_similarities], weights=[0.6,
-                                                                   0.4])[:3]
-    similarities = title_similarities + desc_cntn_similarities
-    filtered_similarities = filter_results(similarities, user_message)
+    title_lexical_similarities = title_lexical_index.query(query, top_k=5)
+    # 유물 명칭을 그대로 검색해 한 점만 맞으면 임베딩 호출 없이 그 결과만 사용.
+    # "분청사기"처럼 여러 점에 맞는 분류 이름은 아래 융합 결과에 합친다
+    exact_similarities = LexicalIndex.exact_matches(query,
+                                                    title_lexical_similarities)
+    if len(exact_similarities) == 1:
+        groups = [exact_similarities]
+    else:
+        try:
+            (
+                title_similarities,
+                description_similarities,
+                content_similarities,
+            ) = query_collections(query, [
+                (title_collection, 5),
+                (description_collection, 30),
+                (content_collection, 30),
+            ])
+        except RETRYABLE_ERRORS as e:
+            print(f"[embedding error] 어휘 검색 결과만 사용합니다: {e}")
+            (
+                title_similarities,
+                description_similarities,
+                content_similarities,
+            ) = ([], [], [])
+        title_ranked_lists = [title_similarities, title_lexical_similarities]
+        if exact_similarities:
+            title_ranked_lists.append(exact_similarities)
+        title_similarities = get_rrf(title_ranked_lists, top_k=5)
+        desc_cntn_similarities = get_rrf(
+            [
+                description_similarities,
+                content_similarities,
+                description_lexical_index.query(query, top_k=30),
+                content_lexical_index.query(query, top_k=30),
+            ],
+            weights=[0.45, 0.3, 0.1, 0.15],
+            top_k=3,
+        )
+        groups = [title_similarities, desc_cntn_similarities]
+    filtered_similarities = reranker.rerank(query, user_message, groups,
+                                            database)
     results = {}
     for similarity in filtered_similarities:
         results[similarity.id] = database[similarity.id]
-        results[similarity.id]["is_presented"] = False
     message = (f"요청하신 전시물이 {len(results)}점 검색되었습니다. [다음] 버튼을 클릭해주세요."
                if len(results) > 0 else
                "요청하신 전시물의 검색 결과가 없습니다. 조금 더 구체적으로 말씀해주세요!")
@@ -116,13 +167,23 @@ def search_historical_facts(query):
 
 def use_tools(messages: list, database: dict):
     # messages.append({"role": "user", "content": tool_use_guide})
-    response = claude.create_tool_response(messages=messages)
+    response = claude.create_tool_response(messages=messages,
+                                           call_site="tool_routing")
     if response.stop_reason != "tool_use":
         return None, None
     tool_content = next(content for content in response.content
                         if content.type == "tool_use")
     searched_database, message_dict = None, None
-    if tool_content.name == "search_relics_by_period_and_genre":
+    if (tool_content.name == "search_relics_by_period_and_genre"
+            and not CategoryIndex.has_filter(tool_content.input)):
+        # 시대/장르 조건이 모두 '전체'면 카탈로그 전체 대신 사용자 질의로 검색한다
+        user_message = messages[-1]
+        query = (user_message["content"] if isinstance(
+            user_message["content"], str) else "")
+        searched_database, message = search_relics_without_period_and_genre(
+            query, database, user_message)
+        message_dict = {"role": "assistant", "content": message}
+    elif tool_content.name == "search_relics_by_period_and_genre":
         searched_database, message = search_relics_by_period_and_genre(
             tool_content.input, database)
         message_dict = {"role": "assistant", "content": message}
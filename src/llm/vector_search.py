@@ -1,10 +1,19 @@
 from dataclasses import dataclass
 import numpy as np
 import os
+import hashlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils import project_root
-from openai import OpenAI
+from utils.storage import atomic_path
 from .llm import claude_3_7 as claude
+from .clients import get_upstage, get_async_upstage
 from .prompt_templates import search_result_filter
+from .embedding_cache import EmbeddingCache
+from .ann_index import IVFIndex
+from .batching import RateLimiter, call_with_retries
+from .quantization import QuantizedMatrix, QUANTIZATION_DTYPES
 import json
 import re
 import streamlit as st
@@ -30,15 +39,14 @@ print(
     st.secrets["UPSTAGE_API_KEY"],
 )
 
-upstage = OpenAI(api_key=os.getenv("UPSTAGE_API_KEY"),
-                 base_url="https://api.upstage.ai/v1")
+upstage = get_upstage()
 
 
 @dataclass(slots=True)
 class DocEmbedding:
     id: str
     doc: str
-    embedding: list[float] | None = None
+    embedding: list[float] | np.ndarray | None = None
 
 
 @dataclass(slots=True)
@@ -66,109 +74,577 @@ class Collecton:
         self.name = name
         self.file_path = project_root / "data" / "vector_store" / f"{name}"
         self.index: dict[str, DocEmbedding] = {}
+        # 검색용 행렬: 행 단위로 정규화된 float32 임베딩과 같은 순서의 id/doc 배열
+        self.ids: np.ndarray = np.empty(0, dtype=object)
+        self.docs: np.ndarray = np.empty(0, dtype=object)
+        self.matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        # matrix가 정규화되지 않은 경우(mmap)에만 사용하는 행별 1/norm
+        self.inv_norms: np.ndarray | None = None
+        self.ann_index: IVFIndex | None = None
+        # id와 문서 해시로 만든 내용 서명. 저장된 ANN 인덱스가 최신인지 확인한다
+        self.signature = ""
+        self.quantized: QuantizedMatrix | None = None
+        self._pending_load: dict | None = None
+        self._load_lock = threading.Lock()
         self._initialized = True
 
-    def load(self) -> "Collecton":
+    def load(self,
+             mmap: bool = True,
+             lazy: bool = False,
+             quantization: str | None = None) -> "Collecton":
+        """
+        • mmap=True: _embeddings.npy를 메모리 매핑으로 열어 복사 없이 행 뷰로 사용
+        • lazy=True: 실제 로드는 첫 검색 시점까지 미룬다
+        • quantization="float16"|"int8": 압축 행렬로 후보를 고르고 원본으로 재채점
+        """
+        if lazy:
+            self._pending_load = {"mmap": mmap, "quantization": quantization}
+            return self
+        with self._load_lock:
+            self._load(mmap=mmap, quantization=quantization)
+        return self
+
+    def ensure_loaded(self):
+        if self._pending_load is None:
+            return
+        with self._load_lock:
+            if self._pending_load is None:
+                return
+            self._load(**self._pending_load)
+
+    def _load(self, mmap: bool, quantization: str | None = None):
         with open(f"{self.file_path}_meta.json", "r", encoding="utf-8") as f:
             docs_list = json.load(f)
 
-        embeddings_array = np.load(f"{self.file_path}_embeddings.npy")
-
-        for doc, embedding in zip(docs_list, embeddings_array):
-            self.index[doc["id"]] = DocEmbedding(id=doc["id"],
-                                                 doc=doc["doc"],
-                                                 embedding=embedding.tolist())
+        embeddings_array = np.load(f"{self.file_path}_embeddings.npy",
+                                   mmap_mode="r" if mmap else None)
+
+        self.index = {
+            doc["id"]: DocEmbedding(id=doc["id"],
+                                    doc=doc["doc"],
+                                    embedding=embedding)
+            for doc, embedding in zip(docs_list, embeddings_array)
+        }
+        self.ids = np.array([doc["id"] for doc in docs_list], dtype=object)
+        self.docs = np.array([doc["doc"] for doc in docs_list], dtype=object)
+        self.signature = content_signature(
+            [doc["id"] for doc in docs_list],
+            [doc.get("hash") or doc_hash(doc["doc"]) for doc in docs_list])
+        self._load_quantized(quantization)
+        if mmap:
+            # 매핑된 페이지를 그대로 공유하도록 행렬은 복사하지 않고 norm만 따로 계산
+            self.matrix = embeddings_array
+            if (self.quantized is not None and
+                    self.quantized.inv_norms is not None):
+                # 압축 파일에 저장된 norm을 쓰면 원본 전체를 읽지 않아도 된다
+                self.inv_norms = self.quantized.inv_norms
+            else:
+                self.inv_norms = inverse_norms(embeddings_array)
+        else:
+            self.matrix = normalize(
+                np.asarray(embeddings_array, dtype=np.float32))
+            self.inv_norms = None
+        self._load_ann_index()
+        self._pending_load = None
+
+    def quantized_path(self, dtype: str) -> str:
+        return f"{self.file_path}_{dtype}.npz"
+
+    def _load_quantized(self, quantization: str | None):
+        self.quantized = None
+        if quantization is None:
+            return
+        path = self.quantized_path(quantization)
+        if not os.path.exists(path):
+            print(f"[{self.name}] {path}가 없어 원본 정밀도로 검색합니다.")
+            return
+        quantized = QuantizedMatrix.load(path)
+        if (len(quantized) != len(self.ids)
+                or quantized.signature != self.signature):
+            print(f"[{self.name}] 압축 행렬이 컬렉션과 맞지 않아 무시합니다. "
+                  f"build_quantized()로 다시 만드세요.")
+            return
+        self.quantized = quantized
+
+    def build_quantized(self, dtype: str = "int8") -> QuantizedMatrix:
+        """압축 행렬을 만들어 _embeddings.npy 옆에 _<dtype>.npz로 저장한다.
+
+        mmap으로 불러오면 _embeddings.npy의 정규화되지 않은 행에 저장된
+        inv_norms를 곱하므로, norm은 항상 그 원본 행으로 계산한다.
+        """
+        self.ensure_loaded()
+        raw = np.load(f"{self.file_path}_embeddings.npy", mmap_mode="r")
+        if len(raw) != len(self.ids):
+            raise ValueError(f"[{self.name}] _embeddings.npy가 컬렉션과 맞지 않습니다. "
+                             f"({len(raw)} != {len(self.ids)})")
+        inv_norms = inverse_norms(raw)
+        quantized = QuantizedMatrix.from_vectors(
+            np.asarray(raw, dtype=np.float32) * inv_norms[:, None],
+            dtype=dtype,
+            inv_norms=inv_norms,
+            signature=self.signature,
+        )
+        quantized.save(self.quantized_path(dtype))
+        return quantized
+
+    def quantization_report(
+        self,
+        dtypes: tuple[str, ...] = QUANTIZATION_DTYPES,
+        top_k: int = 10,
+        rescore_factor: int = 4,
+        sample_size: int = 100,
+    ) -> list[dict]:
+        """dtype별 메모리 절감량과 정확 검색 대비 recall@k(재채점 전/후)."""
+        self.ensure_loaded()
+        normalized = self._normalized_matrix()
+        full_bytes = len(self.ids) * normalized.shape[1] * 4
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(len(self.ids),
+                       min(sample_size, len(self.ids)),
+                       replace=False))
+        exact_tops = [
+            set(select_top_k(normalized @ normalized[i],
+                             np.arange(len(self.ids)), top_k))
+            for i in sample
+        ]
 
-        return self
+        report = []
+        for dtype in dtypes:
+            quantized = QuantizedMatrix.from_vectors(normalized, dtype=dtype)
+            compact_recalls, rescored_recalls = [], []
+            for i, exact_top in zip(sample, exact_tops):
+                compact_scores = quantized.scores(normalized[i])
+                all_rows = np.arange(len(self.ids))
+                compact_top = select_top_k(compact_scores, all_rows, top_k)
+                shortlist = select_top_k(compact_scores, all_rows,
+                                         top_k * rescore_factor)
+                rescored = normalized[shortlist] @ normalized[i]
+                rescored_top = shortlist[select_top_k(
+                    rescored, np.arange(len(shortlist)), top_k)]
+                compact_recalls.append(
+                    len(exact_top & set(compact_top)) / len(exact_top))
+                rescored_recalls.append(
+                    len(exact_top & set(rescored_top)) / len(exact_top))
+            report.append({
+                "collection": self.name,
+                "dtype": dtype,
+                "float32_bytes": full_bytes,
+                "compact_bytes": quantized.nbytes,
+                "saved_bytes": full_bytes - quantized.nbytes,
+                "recall_compact": float(np.mean(compact_recalls)),
+                "recall_rescored": float(np.mean(rescored_recalls)),
+            })
+        return report
+
+    @property
+    def ann_index_path(self) -> str:
+        return f"{self.file_path}_ivf.npz"
+
+    def _load_ann_index(self):
+        self.ann_index = None
+        if not os.path.exists(self.ann_index_path):
+            return
+        ann_index = IVFIndex.load(self.ann_index_path)
+        if (ann_index.n_rows != len(self.ids)
+                or ann_index.signature != self.signature):
+            print(f"[{self.name}] ANN 인덱스가 컬렉션과 맞지 않아 무시합니다. "
+                  f"build_ann_index()로 다시 만드세요.")
+            return
+        self.ann_index = ann_index
+
+    def build_ann_index(self,
+                        n_lists: int | None = None,
+                        n_probe: int = 8,
+                        **kwargs) -> IVFIndex:
+        """IVF 인덱스를 만들어 _embeddings.npy 옆에 _ivf.npz로 저장한다."""
+        self.ensure_loaded()
+        self.ann_index = IVFIndex.build(self._normalized_matrix(),
+                                        n_lists=n_lists,
+                                        n_probe=n_probe,
+                                        signature=self.signature,
+                                        **kwargs)
+        self.ann_index.save(self.ann_index_path)
+        return self.ann_index
+
+    def _normalized_matrix(self) -> np.ndarray:
+        if self.inv_norms is None:
+            return self.matrix
+        return (np.asarray(self.matrix, dtype=np.float32) *
+                self.inv_norms[:, None])
+
+    def ann_recall(self,
+                   query_embeddings: np.ndarray | None = None,
+                   top_k: int = 10,
+                   n_probe: int | None = None,
+                   sample_size: int = 100) -> float:
+        """정확 검색 결과 대비 ANN 검색의 recall@k.
+
+        질의가 주어지지 않으면 컬렉션의 문서 임베딩을 표본으로 사용한다.
+        """
+        self.ensure_loaded()
+        if query_embeddings is None:
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(self.ids),
+                                min(sample_size, len(self.ids)),
+                                replace=False)
+            query_embeddings = self.matrix[np.sort(sample)]
+
+        recalls = []
+        for query_embedding in query_embeddings:
+            exact = self.query_by_embedding(query_embedding,
+                                            cutoff=-1,
+                                            top_k=top_k,
+                                            exact=True)
+            approx = self.query_by_embedding(query_embedding,
+                                             cutoff=-1,
+                                             top_k=top_k,
+                                             n_probe=n_probe)
+            exact_ids = {sim.id for sim in exact}
+            recalls.append(
+                len(exact_ids & {sim.id for sim in approx}) / len(exact_ids))
+        return float(np.mean(recalls)) if recalls else 1.0
+
+    def _build_matrix(self):
+        doc_embeddings = [
+            doc_embedding for doc_embedding in self.index.values()
+            if doc_embedding.embedding is not None
+        ]
+        self.ids = np.array([d.id for d in doc_embeddings], dtype=object)
+        self.docs = np.array([d.doc for d in doc_embeddings], dtype=object)
+        self.signature = content_signature(
+            [d.id for d in doc_embeddings],
+            [doc_hash(d.doc) for d in doc_embeddings])
+        if not doc_embeddings:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            return
+        matrix = np.array([d.embedding for d in doc_embeddings],
+                          dtype=np.float32)
+        self.matrix = normalize(matrix)
+        self.inv_norms = None
+        # 문서가 바뀌었으므로 기존 ANN 인덱스는 같은 설정으로 다시 만든다.
+        # ingest는 clear() 후 build()하므로 메모리에 없어도 파일이 있으면 다시 만든다
+        ann_index = self.ann_index
+        if ann_index is None and os.path.exists(self.ann_index_path):
+            ann_index = IVFIndex.load(self.ann_index_path)
+        if ann_index is not None:
+            self.build_ann_index(n_lists=ann_index.n_lists,
+                                 n_probe=ann_index.n_probe)
+        for dtype in QUANTIZATION_DTYPES:
+            if self.quantized is not None and self.quantized.dtype == dtype:
+                self.quantized = self.build_quantized(dtype)
+            elif os.path.exists(self.quantized_path(dtype)):
+                self.build_quantized(dtype)
+
+    def clear(self):
+        """메모리의 문서를 비운다. 저장소 파일은 다음 build 때 갱신된다."""
+        with self._load_lock:
+            self._pending_load = None
+            self.index.clear()
 
     def add_doc(self, id: str, doc: str):
+        self.ensure_loaded()
         self.index[id] = DocEmbedding(id=id, doc=doc)
 
-    def build(self):
+    def build(self,
+              chunk_size: int = 100,
+              max_workers: int = 1,
+              calls_per_second: float | None = None,
+              max_retries: int = 3):
+        """
+        저장된 벡터와 문서 해시를 비교해 새로 추가되거나 바뀐 문서만 임베딩한다.
+        self.index에 없는 id는 저장소에서 삭제된다.
+
+        청크는 max_workers개 스레드에서 calls_per_second 제한 아래 동시에
+        임베딩하고, 끝난 청크는 체크포인트로 남겨 중단된 빌드를 이어서 진행한다.
+        """
+        stored_embeddings = self._read_stored_embeddings()
+        stored_embeddings.update(self._read_checkpoint())
         doc_embeddings_all = list(self.index.values())
+        changed_doc_embeddings = []
+        for doc_embedding in doc_embeddings_all:
+            stored = stored_embeddings.get(doc_embedding.id)
+            if stored is not None and stored[0] == doc_hash(
+                    doc_embedding.doc):
+                doc_embedding.embedding = stored[1]
+            else:
+                changed_doc_embeddings.append(doc_embedding)
+        removed_count = len(stored_embeddings.keys() - self.index.keys())
+        print(f"[{self.name}] 전체 {len(doc_embeddings_all)}건 중 "
+              f"{len(changed_doc_embeddings)}건 임베딩, {removed_count}건 삭제")
+
         doc_embeddings_chunks = [
-            doc_embeddings_all[i:i + 100]
-            for i in range(0, len(doc_embeddings_all), 100)
+            changed_doc_embeddings[i:i + chunk_size]
+            for i in range(0, len(changed_doc_embeddings), chunk_size)
         ]
+        rate_limiter = RateLimiter(calls_per_second)
 
-        doc_all_list = []
-        embedding_all_list = []
-        for doc_embeddings in doc_embeddings_chunks:
+        def embed_chunk(doc_embeddings: list[DocEmbedding]):
             docs = [doc_embedding.doc for doc_embedding in doc_embeddings]
-            embeddings = self._get_embeddings(docs)
+            embeddings = call_with_retries(
+                lambda: self._get_embeddings(docs),
+                max_retries=max_retries,
+                rate_limiter=rate_limiter,
+            )
             for doc_embedding, embedding in zip(doc_embeddings, embeddings):
                 doc_embedding.embedding = embedding
-                doc_all_list.append({
-                    "id": doc_embedding.id,
-                    "doc": doc_embedding.doc
-                })
-                embedding_all_list.append(embedding)
-
-        embedding_np_array = np.array(embedding_all_list)
-        np.save(f"{self.file_path}_embeddings.npy", embedding_np_array)
+            self._write_checkpoint(doc_embeddings)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(embed_chunk, doc_embeddings)
+                for doc_embeddings in doc_embeddings_chunks
+            ]
+            for done_count, future in enumerate(as_completed(futures), 1):
+                future.result()
+                print(f"[{self.name}] {done_count}/{len(futures)} 청크 완료")
+
+        doc_all_list = [{
+            "id": doc_embedding.id,
+            "doc": doc_embedding.doc,
+            "hash": doc_hash(doc_embedding.doc),
+        } for doc_embedding in doc_embeddings_all]
+        embedding_np_array = np.array(
+            [doc_embedding.embedding for doc_embedding in doc_embeddings_all],
+            dtype=np.float32)
+
+        # 기존 파일이 mmap으로 열려 있을 수 있으므로 임시 파일에 쓴 뒤 교체
+        with atomic_path(f"{self.file_path}_embeddings.npy") as tmp_path:
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding_np_array)
 
         with open(f"{self.file_path}_meta.json", "w", encoding="utf-8") as f:
             json.dump(doc_all_list, f, ensure_ascii=False, indent=2)
 
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self._build_matrix()
+
+    @property
+    def checkpoint_dir(self) -> str:
+        return f"{self.file_path}_checkpoint"
+
+    def _write_checkpoint(self, doc_embeddings: list[DocEmbedding]):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        ids = [doc_embedding.id for doc_embedding in doc_embeddings]
+        chunk_name = doc_hash("\n".join(ids))[:16]
+        with atomic_path(os.path.join(self.checkpoint_dir,
+                                      f"{chunk_name}.npz")) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    ids=np.array(ids),
+                    hashes=np.array([doc_hash(d.doc) for d in doc_embeddings]),
+                    embeddings=np.array([d.embedding for d in doc_embeddings]),
+                )
+
+    def _read_checkpoint(self) -> dict[str, tuple[str, np.ndarray]]:
+        if not os.path.isdir(self.checkpoint_dir):
+            return {}
+        checkpoint = {}
+        for file_name in sorted(os.listdir(self.checkpoint_dir)):
+            if not file_name.endswith(".npz") or ".tmp" in file_name:
+                continue
+            with np.load(os.path.join(self.checkpoint_dir, file_name)) as data:
+                for id, hash, embedding in zip(data["ids"], data["hashes"],
+                                               data["embeddings"]):
+                    checkpoint[str(id)] = (str(hash), embedding)
+        if checkpoint:
+            print(f"[{self.name}] 체크포인트에서 {len(checkpoint)}건 복원")
+        return checkpoint
+
+    def _read_stored_embeddings(self) -> dict[str, tuple[str, np.ndarray]]:
+        """저장소에 있는 id별 (문서 해시, 임베딩). 없으면 빈 dict."""
+        meta_path = f"{self.file_path}_meta.json"
+        embeddings_path = f"{self.file_path}_embeddings.npy"
+        if not (os.path.exists(meta_path) and os.path.exists(embeddings_path)):
+            return {}
+        with open(meta_path, "r", encoding="utf-8") as f:
+            docs_list = json.load(f)
+        embeddings_array = np.load(embeddings_path, mmap_mode="r")
+        # 해시가 없는 이전 형식의 메타는 저장된 문서 원문으로 해시를 계산
+        return {
+            doc["id"]: (doc.get("hash") or doc_hash(doc["doc"]), embedding)
+            for doc, embedding in zip(docs_list, embeddings_array)
+        }
+
     def query(self,
               query: str,
               cutoff=0.4,
-              top_k: int = 60) -> dict[int, Similarity]:
-        query_embedding = self._get_embeddings(query)[0]
-        similarities: list[Similarity] = []
-        for doc_embedding in self.index.values():
-            score = np.dot(query_embedding, doc_embedding.embedding) / (
-                np.linalg.norm(query_embedding) *
-                np.linalg.norm(doc_embedding.embedding))
-            if score < cutoff:
-                continue
-            similarities.append(
-                Similarity(
-                    id=doc_embedding.id,
-                    doc=doc_embedding.doc,
-                    score=float(score),
-                    collection_name=self.name,
-                ))
-
-        similarities = sorted(similarities,
-                              key=lambda x: x.score,
-                              reverse=True)[:top_k]
-        return similarities
+              top_k: int = 60) -> list[Similarity]:
+        query_embedding = get_query_embedding(query)
+        return self.query_by_embedding(query_embedding,
+                                       cutoff=cutoff,
+                                       top_k=top_k)
+
+    def query_by_embedding(self,
+                           query_embedding: list[float] | np.ndarray,
+                           cutoff=0.4,
+                           top_k: int = 60,
+                           exact: bool = False,
+                           n_probe: int | None = None,
+                           rescore_factor: int = 4) -> list[Similarity]:
+        """
+        ANN 인덱스가 있으면 n_probe개 클러스터의 후보만 채점하고,
+        exact=True이거나 인덱스가 없으면 전체를 정확히 채점한다.
+        압축 행렬이 있으면 top_k * rescore_factor개를 압축 표현으로 고른 뒤
+        그 후보만 원본 정밀도로 다시 채점한다.
+        """
+        self.ensure_loaded()
+        if len(self.ids) == 0 or top_k <= 0:
+            return []
+        query_vector = normalize(np.asarray(query_embedding,
+                                            dtype=np.float32))
+        rows = None
+        if self.ann_index is not None and not exact:
+            rows = self.ann_index.candidates(query_vector, n_probe)
+        if self.quantized is not None and not exact:
+            compact_scores = self.quantized.scores(query_vector, rows)
+            shortlist = select_top_k(compact_scores,
+                                     np.arange(len(compact_scores)),
+                                     top_k * rescore_factor)
+            rows = np.sort(shortlist if rows is None else rows[shortlist])
+
+        if rows is None:
+            scores = self.matrix @ query_vector
+            if self.inv_norms is not None:
+                scores = scores * self.inv_norms
+        else:
+            scores = self.matrix[rows] @ query_vector
+            if self.inv_norms is not None:
+                scores = scores * self.inv_norms[rows]
+
+        candidates = select_top_k(scores, np.flatnonzero(scores >= cutoff),
+                                  top_k)
+        positions = candidates if rows is None else rows[candidates]
+
+        return [
+            Similarity(
+                id=self.ids[position],
+                doc=self.docs[position],
+                score=float(scores[i]),
+                collection_name=self.name,
+            ) for i, position in zip(candidates, positions)
+        ]
 
     def _get_embeddings(self, texts: list[str]) -> list[float]:
-        embeddings = upstage.embeddings.create(input=texts,
-                                               model="embedding-query")
-        return [embedding_data.embedding for embedding_data in embeddings.data]
+        return get_embeddings(texts)
 
     def __len__(self) -> int:
+        self.ensure_loaded()
         return len(self.index)
 
 
+def select_top_k(scores: np.ndarray, candidates: np.ndarray,
+                 top_k: int) -> np.ndarray:
+    """후보 위치 중 점수 상위 top_k개를 argpartition으로 골라 내림차순 정렬한다."""
+    if len(candidates) > top_k:
+        top = np.argpartition(scores[candidates], -top_k)[-top_k:]
+        candidates = candidates[top]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def doc_hash(doc: str) -> str:
+    return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+
+def inverse_norms(matrix: np.ndarray) -> np.ndarray:
+    """행별 1/norm. 0인 행은 1로 둔다."""
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+    norms[norms == 0] = 1
+    return (1 / norms).astype(np.float32)
+
+
+def content_signature(ids: list[str], hashes: list[str]) -> str:
+    """컬렉션의 id 순서와 문서 해시로 만든 서명."""
+    digest = hashlib.sha256()
+    for id, hash in zip(ids, hashes):
+        digest.update(f"{id}\t{hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_embeddings(texts: str | list[str]) -> list[list[float]]:
+    embeddings = upstage.embeddings.create(input=texts,
+                                           model="embedding-query")
+    return [embedding_data.embedding for embedding_data in embeddings.data]
+
+
+async def aget_embeddings(texts: str | list[str]) -> list[list[float]]:
+    embeddings = await get_async_upstage().embeddings.create(
+        input=texts, model="embedding-query")
+    return [embedding_data.embedding for embedding_data in embeddings.data]
+
+
+def get_query_embedding(query: str) -> np.ndarray:
+    return embedding_cache.get_or_create(query,
+                                         lambda text: get_embeddings(text)[0])
+
+
+def query_collections(
+    query: str,
+    collections: list[tuple[Collecton, int]],
+    cutoff=0.4,
+) -> list[list[Similarity]]:
+    """질의를 한 번만 임베딩한 뒤 (컬렉션, top_k) 목록 각각에 대해 검색한다."""
+    query_embedding = get_query_embedding(query)
+    return [
+        collection.query_by_embedding(query_embedding,
+                                      cutoff=cutoff,
+                                      top_k=top_k)
+        for collection, top_k in collections
+    ]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """마지막 축 기준 L2 정규화. 영벡터는 그대로 둔다."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
 def get_rrf(
     ranked_lists: list[list[Similarity]],
     k: int = 60,
     weights: list[float] | None = None,
+    top_k: int | None = None,
 ) -> list[Similarity]:
-
+    """
+    id를 정수 위치로 바꿔 RRF 점수를 배열로 누적하고,
+    상위 top_k개에 대해서만 Similarity와 문서 텍스트를 만든다.
+    """
     weights = weights or [1 / len(ranked_lists)] * len(ranked_lists)
-    # rrf_scores = defaultdict(float)
-    rrf_sim_dict: dict[str, Similarity] = {}
-
-    for w, ranked in zip(weights, ranked_lists):
-        for rank, sim in enumerate(ranked, start=1):
-            score = w / (k + rank)
-            if sim.id in rrf_sim_dict:
-                rrf_sim_dict[sim.id].score += score
-                rrf_sim_dict[sim.id].doc += "\n" + sim.doc
-            else:
-                rrf_sim = Similarity(
-                    id=sim.id,
-                    doc=sim.doc,
-                    score=score,
-                )
-                rrf_sim_dict[sim.id] = rrf_sim
-
-    return sorted(rrf_sim_dict.values(), key=lambda x: x.score, reverse=True)
+    flat_sims = [sim for ranked in ranked_lists for sim in ranked]
+    if not flat_sims:
+        return []
+
+    unique_ids, positions = np.unique(np.array([sim.id for sim in flat_sims]),
+                                      return_inverse=True)
+    contributions = np.concatenate([
+        w / (k + np.arange(1, len(ranked) + 1, dtype=np.float64))
+        for w, ranked in zip(weights, ranked_lists)
+    ])
+    scores = np.bincount(positions,
+                         weights=contributions,
+                         minlength=len(unique_ids))
+
+    # 점수 내림차순, 동점이면 먼저 등장한 id 순
+    first_seen = np.full(len(unique_ids), len(flat_sims))
+    np.minimum.at(first_seen, positions, np.arange(len(flat_sims)))
+    candidates = np.lexsort((first_seen, -scores))[:top_k]
+
+    # 같은 id의 문서는 처음 등장한 순서대로 한 번씩만 이어 붙인다
+    docs: dict[int, list[str]] = {int(position): [] for position in candidates}
+    for sim, position in zip(flat_sims, positions):
+        position_docs = docs.get(int(position))
+        if position_docs is not None and sim.doc not in position_docs:
+            position_docs.append(sim.doc)
+
+    return [
+        Similarity(
+            id=str(unique_ids[position]),
+            doc="\n".join(docs[int(position)]),
+            score=float(scores[position]),
+        ) for position in candidates
+    ]
 
 
 def filter_results(similarities: list[Similarity], query: str):
@@ -198,6 +674,7 @@ def filter_results(similarities: list[Similarity], query: str):
             },
         ],
         stop_sequences=["</json>"],
+        call_site="filter_results",
     )
     filtered_similarities: list[Similarity] = []
     search_sim_results = {sim.id: sim for sim in similarities}
@@ -225,6 +702,11 @@ def clean_text(text: str, replace_with: str = "") -> str:
     return text
 
 
-title_collection = Collecton("title").load()
-content_collection = Collecton("content").load()
-description_collection = Collecton("description").load()
+embedding_cache = EmbeddingCache(
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+    cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+)
+
+title_collection = Collecton("title").load(lazy=True)
+content_collection = Collecton("content").load(lazy=True)
+description_collection = Collecton("description").load(lazy=True)
@@ -113,7 +113,7 @@ class ReservationAgent:
         raise ValueError("Too many tries")
 
     async def _delegate_to_slackbot(self, messages: list[dict]):
-        response = self._call_llm(messages)
+        response = await self._call_llm(messages)
         tries = 0
         while True:
             tool_content = next(content for content in response.content
@@ -147,7 +147,7 @@ class ReservationAgent:
                     }],
                 },
             ])
-            response = self._call_llm(messages)
+            response = await self._call_llm(messages)
             if tries > 10:
                 raise ValueError("Too many tries")
             tries += 1
@@ -175,13 +175,14 @@ class ReservationAgent:
         else:
             send_fail_mail(receiver)
 
-    def _call_llm(self, messages: list[dict]):
-        response = claude.create_tool_response(
+    async def _call_llm(self, messages: list[dict]):
+        response = await claude.acreate_tool_response(
             messages=messages,
             temperature=0.0,
             max_tokens=1024,
             tools=self.tools,
             tool_system_prompt=slackbot_system_prompt,
+            call_site="reservation_agent",
         )
         return response
 
@@ -0,0 +1,162 @@
+"""
+전시물 이미지를 토큰 예산에 맞게 줄인 JPEG base64 payload 캐시 (메모리 + data/image_cache).
+
+    cd src && python -m utils.image_cache --workers 4
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+from .utils import project_root
+from .storage import LRUCache, atomic_write_bytes
+
+TOKENS_PER_PIXEL = 1 / 750
+
+
+def encode_image(file_path: str, token_budget: int, quality: int) -> bytes:
+    """토큰 예산에 맞게 줄인 JPEG 바이트. 프로세스 풀에서 쓰이므로 모듈 함수로 둔다."""
+    with Image.open(file_path) as img:
+        width, height = img.size
+        tokens = width * height * TOKENS_PER_PIXEL
+        if tokens > token_budget:
+            scale = (token_budget / tokens)**0.5
+            img = img.resize(
+                (max(1, int(width * scale)), max(1, int(height * scale))),
+                Image.LANCZOS)
+        buffer = BytesIO()
+        img.convert("RGB").save(buffer,
+                                format="JPEG",
+                                quality=quality,
+                                optimize=True)
+    return buffer.getvalue()
+
+
+class ImagePayloadCache:
+
+    def __init__(
+        self,
+        token_budget: int = 1600,
+        quality: int = 85,
+        cache_dir: str | Path | None = None,
+        max_memory_items: int = 512,
+    ):
+        self.token_budget = token_budget
+        self.quality = quality
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_items = max_memory_items
+        self._memory: LRUCache[str, str] = LRUCache(max_memory_items)
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, file_path: str | Path) -> str:
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        raw = json.dumps([
+            str(path), stat.st_mtime_ns, stat.st_size, self.token_budget,
+            self.quality
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, file_path: str | Path) -> str:
+        """base64로 인코딩된 JPEG payload."""
+        key = self.key(file_path)
+        payload = self._memory.get(key)
+        if payload is not None:
+            return payload
+        jpeg = self._read_disk(key)
+        if jpeg is None:
+            jpeg = encode_image(str(file_path), self.token_budget,
+                                self.quality)
+            self._write_disk(key, jpeg)
+        return self._remember(key, jpeg)
+
+    def precompute(self, file_paths: list[str | Path], max_workers: int = 4):
+        """디스크에 없는 이미지만 프로세스 풀에서 인코딩한다."""
+        missing, not_found = [], []
+        for file_path in file_paths:
+            if not Path(file_path).exists():
+                not_found.append(str(file_path))
+                continue
+            key = self.key(file_path)
+            jpeg = self._read_disk(key)
+            if jpeg is None:
+                missing.append((key, str(file_path)))
+            else:
+                self._remember(key, jpeg)
+        if not_found:
+            print(f"[image cache] 원본 이미지가 없어 건너뜀: {not_found}")
+        if not missing:
+            return
+        print(f"[image cache] {len(missing)}개 이미지 인코딩 "
+              f"(예산 {self.token_budget} 토큰)")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            encoded = executor.map(
+                encode_image,
+                [file_path for _, file_path in missing],
+                [self.token_budget] * len(missing),
+                [self.quality] * len(missing),
+                chunksize=8,
+            )
+            for (key, _), jpeg in zip(missing, encoded):
+                self._write_disk(key, jpeg)
+                self._remember(key, jpeg)
+
+    def _remember(self, key: str, jpeg: bytes) -> str:
+        payload = base64.b64encode(jpeg).decode("utf-8")
+        self._memory.put(key, payload)
+        return payload
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.jpg"
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if not self.cache_dir:
+            return None
+        try:
+            return self._disk_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, jpeg: bytes):
+        if not self.cache_dir:
+            return
+        atomic_write_bytes(self._disk_path(key), jpeg)
+
+
+image_cache_dir = os.getenv("IMAGE_CACHE_DIR",
+                            str(project_root / "data" / "image_cache"))
+image_payload_cache = ImagePayloadCache(
+    # 기본값은 API가 받는 상한(약 1.15MP, 1600토큰). 비용을 줄이려면 낮춘다
+    token_budget=int(os.getenv("IMAGE_TOKEN_BUDGET", "1600")),
+    quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+    cache_dir=image_cache_dir or None,
+)
+
+
+def relic_image_paths() -> list[Path]:
+    # 카탈로그가 relic_img_path로 만들어 둔 img_path를 쓴다 (utils가 llm을 먼저
+    # 불러오지 않도록 여기서 import)
+    from llm.catalog import RelicCatalog
+
+    return [
+        project_root / relic["img_path"]
+        for relic in RelicCatalog().database.values()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="전시물 이미지 payload 사전 생성")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    image_payload_cache.precompute(relic_image_paths(),
+                                   max_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Generic, Hashable, Iterator, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@contextmanager
+def atomic_path(path: str | Path) -> Iterator[Path]:
+    """path 대신 쓸 임시 경로. 블록이 끝나면 path로 교체하고, 실패하면 지운다.
+
+    동시에 읽는 쪽에 반쯤 쓰인 파일이 보이지 않고, 여러 프로세스/스레드가 같은
+    파일을 써도 임시 파일이 겹치지 않는다.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(
+        f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.unlink(missing_ok=True)  # 중단된 이전 실행이 남긴 파일
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def atomic_write_bytes(path: str | Path, data: bytes):
+    with atomic_path(path) as tmp_path:
+        tmp_path.write_bytes(data)
+
+
+def atomic_write_text(path: str | Path, text: str):
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+class LRUCache(Generic[K, V]):
+    """최근에 쓴 max_size개만 남기는 스레드 안전 메모리 캐시."""
+
+    def __init__(self,
+                 max_size: int,
+                 on_evict: Callable[[K], None] | None = None):
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: K, value: V):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                evicted, _ = self._items.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(evicted)
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            return self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, key: K) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
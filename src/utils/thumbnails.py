@@ -0,0 +1,71 @@
+"""
+사이드바 카드용 WebP 썸네일을 src/static/thumbs/에 만들어 정적 파일로 내보낸다.
+
+    cd src && python -m utils.thumbnails --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+from .utils import project_root
+from .image_cache import relic_image_paths
+from .storage import atomic_path
+
+THUMBNAIL_SIZE = (450, 540)
+THUMBNAIL_QUALITY = 80
+static_dir = project_root / "src" / "static"
+thumbnail_dir = static_dir / "thumbs"
+
+
+def thumbnail_path(img_path: str | Path,
+                   size: tuple[int, int] = THUMBNAIL_SIZE) -> Path:
+    path = Path(img_path).resolve()
+    stat = path.stat()
+    raw = json.dumps([str(path), stat.st_mtime_ns, stat.st_size, size])
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+    return thumbnail_dir / f"{digest}.webp"
+
+
+def make_thumbnail(img_path: str | Path,
+                   size: tuple[int, int] = THUMBNAIL_SIZE) -> Path:
+    """없으면 만들고 썸네일 경로를 돌려준다. 프로세스 풀에서도 쓰인다."""
+    target = thumbnail_path(img_path, size)
+    if target.exists():
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with Image.open(img_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.LANCZOS)  # 비율 유지, 확대하지 않음
+        # 여러 세션이 같은 썸네일을 동시에 만들 수 있다
+        with atomic_path(target) as tmp_path:
+            img.save(tmp_path, format="WEBP", quality=THUMBNAIL_QUALITY)
+    return target
+
+
+def thumbnail_url(img_path: str | Path) -> str:
+    """Streamlit 정적 파일 경로."""
+    relative = make_thumbnail(img_path).relative_to(static_dir)
+    return f"app/static/{relative.as_posix()}"
+
+
+def precompute_thumbnails(img_paths: list[str | Path], max_workers: int = 4):
+    existing = [str(path) for path in img_paths if Path(path).exists()]
+    if len(existing) < len(img_paths):
+        missing = sorted(set(map(str, img_paths)) - set(existing))
+        print(f"[thumbnails] 원본 이미지가 없어 건너뜀: {missing}")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(make_thumbnail, existing, chunksize=8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="사이드바 썸네일 사전 생성")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    precompute_thumbnails(relic_image_paths(), max_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()